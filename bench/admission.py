@@ -0,0 +1,136 @@
+"""
+Admission control (app/admission.py) against the local D1 stand-in.
+
+Scenarios through `Default.fetch`:
+  flood  - one IP hammers reads (rotating X-Telegram-Id does not help) while a
+           second IP stays within budget
+  bot    - the bot (X-Bot-Key) reads for many users from one IP; each telegram_id
+           has its own budget
+  writes - one client sends a burst of bookings
+  batch  - a 20-operation /api/batch costs 20 write tokens: the client's next
+           write is a 429 even though it sent only one request before
+  shed   - D1 slows down until its smoothed latency passes SHED_D1_LATENCY_MS:
+           ordinary reads get 503 + Retry-After, critical ones (/ready) and
+           writes still go through
+
+The batch and shed outcomes are checked; the exit status is 1 on a mismatch.
+
+    python bench/admission.py [--flood 300] [--slow-d1-ms 300]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, "stubs"), os.path.join(HERE, "..", "src")]
+
+from workers import Request  # noqa: E402
+from local_d1 import LocalD1, make_env  # noqa: E402
+
+BASE_URL = "http://localhost"
+BOT_API_KEY = "bench-bot-key"
+
+
+def request(method: str, path: str, body=None, telegram_id=None, ip="203.0.113.7", bot=False) -> Request:
+    headers = {"CF-Connecting-IP": ip}
+    if telegram_id is not None:
+        headers["X-Telegram-Id"] = str(telegram_id)
+    if bot:
+        headers["X-Bot-Key"] = BOT_API_KEY
+    return Request(BASE_URL + path, method=method, headers=headers,
+                   body=json.dumps(body) if body is not None else None)
+
+
+def check(label: str, result: dict, statuses: dict, retry_after: list[str] | None = None) -> bool:
+    ok = result["statuses"] == statuses and (retry_after is None or result["retry_after"] == retry_after)
+    print(f"{label:<20}: {result}" + ("" if ok else f"  MISMATCH, expected {statuses} retry_after {retry_after}"))
+    return ok
+
+
+async def run(worker, env, reqs: list[Request]) -> dict:
+    statuses: dict[int, int] = {}
+    retry_after = set()
+    for resp in await asyncio.gather(*(worker.fetch(r, env) for r in reqs)):
+        statuses[resp.status] = statuses.get(resp.status, 0) + 1
+        if resp.headers.get("Retry-After"):
+            retry_after.add(resp.headers.get("Retry-After"))
+    return {"statuses": dict(sorted(statuses.items())), "retry_after": sorted(retry_after)}
+
+
+def seed(db: LocalD1):
+    conn = db.conn
+    conn.execute("INSERT INTO users (telegram_id, phone, name, role) VALUES (1, 'admin', 'Admin', 'admin')")
+    conn.executemany("INSERT INTO users (telegram_id, phone, name, role) VALUES (?, ?, ?, 'user')",
+                     [(100 + i, f"+7{i:09d}", f"user{i}") for i in range(10)])
+    conn.executemany("INSERT INTO bookings (user_id, date, time) VALUES (1, '2030-01-01', ?)",
+                     [(f"{h:02d}:{m:02d}",) for h in range(8, 20) for m in range(0, 60, 5)])
+    conn.commit()
+
+
+async def main_async(args):
+    from worker import Default
+    from app import admission, metrics
+
+    db = LocalD1()
+    db.apply_migrations()
+    seed(db)
+    env = make_env(db, BOT_API_KEY=BOT_API_KEY)
+    worker = Default(None, env)
+    print(f"budgets: read {admission.READ_RATE}/s burst {admission.READ_BURST:.0f}, "
+          f"write {admission.WRITE_RATE}/s burst {admission.WRITE_BURST:.0f}; "
+          f"shed above {admission.SHED_D1_LATENCY_MS:.0f} ms")
+
+    flood = [request("GET", "/api/slots?date=2030-01-01", telegram_id=1000 + i) for i in range(args.flood)]
+    polite = [request("GET", "/api/bookings/by-user/101", ip="198.51.100.9") for _ in range(10)]
+    print("flood  noisy client :", await run(worker, env, flood))
+    print("flood  other client :", await run(worker, env, polite))
+    bot = [request("GET", "/api/slots?date=2030-01-01", telegram_id=2000 + i % 50, ip="192.0.2.1", bot=True)
+           for i in range(args.flood)]
+    print(f"bot    {args.flood} reads, 50 users:", await run(worker, env, bot))
+
+    times = [f"{h:02d}:{m:02d}" for h in range(8, 20) for m in range(0, 60, 5)]
+    writes = [request("POST", "/api/bookings", {"telegram_id": 102, "date": "2030-01-01", "time": t},
+                      telegram_id=102, ip="198.51.100.10") for t in times[:30]]
+    print("writes burst        :", await run(worker, env, writes))
+    ops = [{"method": "POST", "path": "/api/bookings", "body": {"telegram_id": 103, "date": "2030-01-01", "time": t}}
+           for t in times[30:50]]
+    ok = True
+    ok &= check("batch  20 operations", await run(worker, env, [request("POST", "/api/batch", {"operations": ops},
+                                                                       ip="198.51.100.11")]), {200: 1})
+    ok &= check("batch  next write", await run(worker, env, [request(
+        "POST", "/api/bookings", {"telegram_id": 103, "date": "2030-01-01", "time": times[50]},
+        ip="198.51.100.11")]), {429: 1})
+
+    db.latency = args.slow_d1_ms / 1000.0
+    # Warm the smoothed latency past the threshold (it only moves D1_EWMA_ALPHA per statement)
+    for i in range(args.warm_max):
+        if metrics.d1_latency_ms() > admission.SHED_D1_LATENCY_MS:
+            break
+        await run(worker, env, [request("GET", "/api/slots?date=2030-01-01", ip=f"198.51.101.{i % 250}")])
+    print(f"shed   d1 ewma {metrics.d1_latency_ms():.0f} ms")
+    retry = [str(admission.SHED_RETRY_AFTER)]
+    ok &= check("shed   reads", await run(worker, env, [request("GET", "/api/slots?date=2030-01-01",
+                                                               ip="198.51.100.30") for _ in range(20)]),
+                {503: 20}, retry)
+    ok &= check("shed   /ready", await run(worker, env, [request("GET", "/ready", ip="198.51.100.31")]), {200: 1})
+    ok &= check("shed   write", await run(worker, env, [request(
+        "POST", "/api/bookings", {"telegram_id": 104, "date": "2030-01-01", "time": times[-1]},
+        ip="198.51.100.32")]), {200: 1})
+
+    print()
+    print("\n".join(line for line in metrics.render_prometheus().splitlines() if line.startswith("admission_")))
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--flood", type=int, default=300, help="requests from the noisy client")
+    ap.add_argument("--slow-d1-ms", type=float, default=300.0, help="D1 round trip latency for the shed scenario")
+    ap.add_argument("--warm-max", type=int, default=100, help="slow reads at most to push the D1 latency up")
+    sys.exit(0 if asyncio.run(main_async(ap.parse_args())) else 1)
+
+
+if __name__ == "__main__":
+    main()
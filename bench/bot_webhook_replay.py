@@ -0,0 +1,250 @@
+"""
+Replay Telegram conversations through the bot's real handlers behind the webhook ingress.
+
+The Application comes from src/telegram_bot.py (build_app) with two stand-ins:
+the Bot API answers locally after --telegram-ms (FakeTelegram, a
+telegram.request.BaseRequest), and the bot's ApiClient talks to the Worker
+running in the same process on the local D1 stand-in (Default.fetch through an
+httpx transport). Everything else - ingress, ConversationHandler, handlers,
+session cache, API client, Worker, SQL - is the production code.
+
+Every simulated chat books a free slot: /book, a date, the time button, name,
+phone, then "my bookings"; a chat sends its next update --think-ms after the
+previous one was accepted. Updates are POSTed to WebhookIngress; with
+--processes N they go to N forked bot processes by chat (bot.webhook.ChatShards),
+or at random with --spread random, which is what SO_REUSEPORT alone would do.
+At the end each chat should own exactly one booking in D1.
+
+Telegram's own send limits (bot.sender.SendQueue) are lifted so that the
+numbers are the handlers', not 25 messages/s.
+
+    python bench/bot_webhook_replay.py [--chats 500] [--think-ms 100] [--workers 64]
+                                       [--processes 1] [--spread chat] [--telegram-ms 30]
+                                       [--d1-latency-ms 2]
+
+Needs python-telegram-bot, httpx and aiohttp.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(HERE, "stubs"), os.path.join(HERE, "..", "src")]
+
+import aiohttp  # noqa: E402
+import httpx  # noqa: E402
+from telegram.request import BaseRequest  # noqa: E402
+from workers import Request  # noqa: E402
+from local_d1 import LocalD1, make_env  # noqa: E402
+from load import seed  # noqa: E402
+from bot.webhook import WebhookIngress, ChatShards, SECRET_HEADER, update_processor  # noqa: E402
+
+SECRET = "bench-secret"
+BOT_API_KEY = "bench-bot-key"
+FIRST_CHAT = 500_000
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class FakeTelegram(BaseRequest):
+    """Bot API calls answered locally after a fixed delay."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._message_id = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url, method, request_data=None, **_timeouts):
+        endpoint = url.rsplit("/", 1)[-1]
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        params = request_data.parameters if request_data is not None else {}
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint in ("sendMessage", "editMessageText"):
+            self._message_id += 1
+            result = {"message_id": self._message_id, "date": int(time.time()), "from": BOT_USER,
+                      "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+                      "text": params.get("text", "")}
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+def worker_transport(db: LocalD1) -> httpx.MockTransport:
+    """The Worker (Default.fetch) in this process, behind an httpx transport."""
+    from worker import Default
+    env = make_env(db, BOT_API_KEY=BOT_API_KEY)
+    worker = Default(None, env)
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        resp = await worker.fetch(Request(str(request.url), method=request.method, headers=dict(request.headers),
+                                          body=request.content.decode() or None), env)
+        content = (await resp.text()).encode()
+        if resp.headers.get("Content-Encoding") == "gzip":
+            content = gzip.compress(content)  # what the Workers runtime does with that header
+        return httpx.Response(resp.status, headers=dict(resp.headers), content=content)
+    return httpx.MockTransport(handle)
+
+
+def application_factory(args, db_path: str):
+    def make_application():
+        # Runs in every bot process (after fork): own D1 connection, API client and Bot
+        import telegram_bot
+        from telegram.ext import ApplicationBuilder
+        from bot.api import ApiClient
+        from bot.sender import SendQueue
+        from app import admission, metrics
+        admission.READ_BURST = admission.WRITE_BURST = float("inf")
+        metrics.LOG_SAMPLE_RATE = 0.0
+        db = LocalD1(db_path, latency_ms=args.d1_latency_ms)
+        telegram_bot.api = ApiClient(telegram_bot.API_URL, api_key=BOT_API_KEY)
+        telegram_bot.api._client = httpx.AsyncClient(transport=worker_transport(db), headers={"X-Bot-Key": BOT_API_KEY})
+        telegram_bot.sender = SendQueue(global_rate=1e9, global_burst=1e9, chat_rate=1e9, chat_burst=1e9)
+        fake = FakeTelegram(args.telegram_ms / 1000)
+        return telegram_bot.build_app(ApplicationBuilder().request(fake).get_updates_request(fake))
+    return make_application
+
+
+def conversation(chat: int, date: str, slot: str) -> list[dict]:
+    user = {"id": chat, "is_bot": False, "first_name": f"Load{chat}"}
+    chat_obj = {"id": chat, "type": "private"}
+    now = int(time.time())
+
+    def message(text: str) -> dict:
+        msg = {"message_id": 1, "date": now, "chat": chat_obj, "from": user, "text": text}
+        if text.startswith("/"):
+            msg["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+        return {"message": msg}
+
+    def button(data: str) -> dict:
+        return {"callback_query": {"id": f"{chat}:{data}", "from": user, "chat_instance": str(chat), "data": data,
+                                   "message": {"message_id": 2, "date": now, "chat": chat_obj, "from": BOT_USER,
+                                               "text": "..."}}}
+
+    return [message("/book"), message(date), button(f"time:{slot}"), message(f"Load {chat}"),
+            message(f"+7999{chat:07d}"), button("show_bookings")]
+
+
+class RandomShards(ChatShards):
+    """No chat affinity: every update to any process, like SO_REUSEPORT."""
+
+    async def process(self, data: dict) -> None:
+        queue = random.choice(self.queues)
+        await asyncio.get_running_loop().run_in_executor(None, queue.put, json.dumps(data))
+
+
+async def replay(args, ingress: WebhookIngress, chats: list[list[dict]]) -> tuple[float, dict]:
+    await ingress.start("127.0.0.1", args.port)
+    url = f"http://127.0.0.1:{args.port}{ingress.path}"
+    statuses: dict[int, int] = {}
+    update_id = 0
+
+    async with aiohttp.ClientSession(headers={SECRET_HEADER: SECRET},
+                                     connector=aiohttp.TCPConnector(limit=args.concurrency)) as session:
+        async def post(update: dict):
+            # Telegram redelivers after a 503; so do we
+            while True:
+                async with session.post(url, json=update) as resp:
+                    statuses[resp.status] = statuses.get(resp.status, 0) + 1
+                    if resp.status != 503:
+                        return
+                await asyncio.sleep(0.05)
+
+        async def chat(updates: list[dict]):
+            nonlocal update_id
+            await asyncio.sleep(random.uniform(0, args.think_ms / 1000))
+            for update in updates:
+                update_id += 1
+                await post({"update_id": update_id, **update})
+                await asyncio.sleep(args.think_ms / 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(chat(c) for c in chats))
+        await ingress.stop(drain=True)
+    return start, statuses
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chats", type=int, default=500)
+    ap.add_argument("--think-ms", type=float, default=100.0, help="pause between two updates of one chat")
+    ap.add_argument("--workers", type=int, default=64, help="ingress workers (per bot process)")
+    ap.add_argument("--processes", type=int, default=1)
+    ap.add_argument("--spread", choices=["chat", "random"], default="chat", help="how updates reach processes")
+    ap.add_argument("--telegram-ms", type=float, default=30.0, help="Bot API call latency")
+    ap.add_argument("--d1-latency-ms", type=float, default=2.0)
+    ap.add_argument("--queue", type=int, default=1000)
+    ap.add_argument("--concurrency", type=int, default=200, help="HTTP connections to the ingress")
+    ap.add_argument("--port", type=int, default=8089)
+    args = ap.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.sqlite")
+    db = LocalD1(db_path)
+    db.apply_migrations()
+    seed(db, 10, args.chats * 3)
+    free = db.conn.execute("SELECT b.date, b.time FROM bookings b JOIN users u ON u.id = b.user_id "
+                           "WHERE u.role = 'admin' ORDER BY b.slot_start LIMIT ?", (args.chats,)).fetchall()
+    db.conn.close()
+    chats = [conversation(FIRST_CHAT + i, d, t) for i, (d, t) in enumerate(free)]
+    total_updates = sum(len(c) for c in chats)
+    make_application = application_factory(args, db_path)
+    latencies: list[float] = []
+
+    if args.processes > 1:
+        # Fork before any event loop exists in this process
+        shards = (RandomShards if args.spread == "random" else ChatShards)(
+            make_application, args.processes, workers=args.workers, queue_size=args.queue)
+        shards.start()
+        ingress = WebhookIngress(shards.process, secret=SECRET, workers=args.workers, queue_size=args.queue)
+        start, statuses = asyncio.run(replay(args, ingress, chats))
+        shards.stop()
+    else:
+        async def single():
+            application = make_application()
+            await application.initialize()
+            await application.start()
+            process = update_processor(application)
+
+            async def timed(data: dict):
+                t0 = time.perf_counter()
+                await process(data)
+                latencies.append((time.perf_counter() - t0) * 1000)
+
+            ingress = WebhookIngress(timed, secret=SECRET, workers=args.workers, queue_size=args.queue)
+            try:
+                return await replay(args, ingress, chats)
+            finally:
+                await application.stop()
+                await application.shutdown()
+        start, statuses = asyncio.run(single())
+    total = time.perf_counter() - start
+
+    db = LocalD1(db_path)
+    booked = db.conn.execute("SELECT COUNT(DISTINCT u.telegram_id) FROM bookings b JOIN users u ON u.id = b.user_id "
+                             "WHERE u.telegram_id >= ?", (FIRST_CHAT,)).fetchone()[0]
+    print(f"{len(chats)} chats x {len(chats[0])} updates, think {args.think_ms:.0f} ms, Bot API {args.telegram_ms:.0f} ms, "
+          f"D1 {args.d1_latency_ms:.0f} ms; {args.processes} process(es), spread by {args.spread}, "
+          f"{args.workers} workers each")
+    print(f"processed : {total_updates / total:8.0f} updates/s  ({total:.2f}s)  ingress statuses {statuses}")
+    if latencies:
+        q = statistics.quantiles(latencies, n=100)
+        print(f"handler   : p50 {q[49]:.1f} ms  p95 {q[94]:.1f} ms  p99 {q[98]:.1f} ms")
+    print(f"booked    : {booked} of {len(chats)} chats completed /book")
+
+
+if __name__ == "__main__":
+    main()
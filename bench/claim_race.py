@@ -0,0 +1,112 @@
+"""
+Concurrency check for the slot claim in POST /api/bookings, against a local
+SQLite database built from migrations/.
+
+Many threads, each with its own connection, try to book the same slot at once.
+The single-statement claim (CLAIM_SLOT_SQL) must produce exactly one winner;
+the previous SELECT-then-UPDATE flow is run for comparison.
+
+    python bench/claim_race.py [--users 32] [--rounds 50]
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path[:0] = [os.path.join(HERE, "stubs"), os.path.join(ROOT, "src")]
+
+from app.endpoints.users import CLAIM_SLOT_SQL, parse_slot  # noqa: E402
+
+
+def create_db(path: str, users: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    for f in sorted(glob.glob(os.path.join(ROOT, "migrations", "*.sql"))):
+        try:
+            conn.executescript(open(f, encoding="utf-8").read())
+        except sqlite3.OperationalError as e:
+            if "already exists" not in str(e):
+                raise
+    conn.execute("INSERT INTO users (telegram_id, phone, name, role) VALUES (1, 'admin', 'Admin', 'admin')")
+    conn.executemany("INSERT INTO users (telegram_id, phone, name, role) VALUES (?, ?, ?, 'user')",
+                     [(100 + i, f"+7{i:09d}", f"user{i}") for i in range(users)])
+    conn.commit()
+    conn.close()
+
+
+def claim_atomic(conn, user_id, date, time):
+    row = conn.execute(CLAIM_SLOT_SQL, (user_id, parse_slot(date, time), user_id)).fetchone()
+    conn.commit()
+    return row is not None
+
+
+def claim_legacy(conn, user_id, date, time, gate):
+    admin_id = conn.execute("SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1").fetchone()[0]
+    slot = conn.execute("SELECT id FROM bookings WHERE user_id = ? AND date = ? AND time = ?",
+                        (admin_id, date, time)).fetchone()
+    gate.wait()  # every request has seen the slot as free
+    if not slot:
+        return False
+    conn.execute("UPDATE bookings SET user_id = ? WHERE id = ?", (user_id, slot[0]))
+    conn.commit()
+    return True
+
+
+def race(path: str, users: int, rounds: int, legacy: bool) -> tuple[int, int]:
+    conns = [sqlite3.connect(path, timeout=30, check_same_thread=False) for _ in range(users)]
+    admin_id = conns[0].execute("SELECT id FROM users WHERE role = 'admin'").fetchone()[0]
+    user_ids = [r[0] for r in conns[0].execute("SELECT id FROM users WHERE role = 'user' ORDER BY id")]
+    clean = double = 0
+    for r in range(rounds):
+        date, time = f"2030-01-{1 + r % 28:02d}", f"{8 + r // 28:02d}:00"
+        conns[0].execute("INSERT INTO bookings (user_id, date, time) VALUES (?, ?, ?)", (admin_id, date, time))
+        conns[0].commit()
+        start, gate = threading.Barrier(users), threading.Barrier(users)
+        wins = []
+
+        def worker(i):
+            start.wait()
+            ok = (claim_legacy(conns[i], user_ids[i], date, time, gate) if legacy
+                  else claim_atomic(conns[i], user_ids[i], date, time))
+            if ok:
+                wins.append(i)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(users)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if len(wins) == 1:
+            clean += 1
+        else:
+            double += 1
+    for c in conns:
+        c.close()
+    return clean, double
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=32)
+    ap.add_argument("--rounds", type=int, default=50)
+    args = ap.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for legacy in (False, True):
+            path = os.path.join(tmp, f"race_{int(legacy)}.sqlite")
+            create_db(path, args.users)
+            clean, double = race(path, args.users, args.rounds, legacy)
+            name = "select+update" if legacy else "atomic claim "
+            print(f"{name}: {clean} rounds with one winner, {double} rounds with several")
+            failed |= not legacy and double > 0
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Cold-start benchmark for the Worker module against the stand-in `workers` runtime.
+
+Every sample is a fresh interpreter: it times `import worker` and then the first
+request to one path (D1 is the local stand-in, set up outside the timed part).
+`eager` imports every endpoint module, Swagger and friends up front, as
+worker.py did before routes were declared lazily, for comparison.
+Also checks that app/endpoints ROUTES matches the @route decorators.
+
+    python bench/cold_start.py [--runs 15] [--paths /health,/api/users?limit=5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, "..", "src")
+
+CHILD = r"""
+import asyncio, json, sys, time
+sys.path[:0] = [{stubs!r}, {src!r}]
+mode, path = sys.argv[1], sys.argv[2]
+
+start = time.perf_counter()
+import worker
+if mode == "eager":
+    import traceback, asyncio  # noqa: F401
+    from app import router, swagger, idempotency  # noqa: F401
+    router.load_all()
+import_ms = (time.perf_counter() - start) * 1000
+modules = len(sys.modules)
+
+sys.path.insert(0, {bench!r})
+from local_d1 import LocalD1, make_env
+from workers import Request
+db = LocalD1()
+db.apply_migrations()
+entry = worker.Default(None, make_env(db))
+
+start = time.perf_counter()
+resp = asyncio.run(entry.fetch(Request("http://localhost" + path), None))
+first_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{"import_ms": import_ms, "first_ms": first_ms, "status": resp.status, "modules": modules}}))
+"""
+
+
+def sample(mode: str, path: str) -> dict:
+    code = CHILD.format(stubs=os.path.join(HERE, "stubs"), src=SRC, bench=HERE)
+    out = subprocess.run([sys.executable, "-c", code, mode, path], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def check_manifest() -> list[str]:
+    """Routes registered by @route but missing from ROUTES, and the other way round."""
+    code = (f"import sys; sys.path[:0] = [{os.path.join(HERE, 'stubs')!r}, {SRC!r}]\n"
+            "from app import router\n"
+            "from app.endpoints import ROUTES\n"
+            "import importlib\n"
+            "for m in ROUTES: importlib.import_module(m)\n"
+            "real = {(m, p, fn.__module__) for m, p, *_r, fn, _meta in router._routes}\n"
+            "declared = {(m, p, mod) for mod, rs in ROUTES.items() for m, p in rs}\n"
+            "for r in sorted(real - declared): print('not in ROUTES:', *r)\n"
+            "for r in sorted(declared - real): print('no @route for:', *r)\n")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return out.stdout.splitlines()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=15, help="fresh interpreters per (mode, path)")
+    ap.add_argument("--paths", default="/health,/api/users?limit=5,/api/slots?date=2030-01-01,/openapi.json")
+    args = ap.parse_args()
+
+    problems = check_manifest()
+    print("manifest:", "ok" if not problems else "")
+    for line in problems:
+        print("  " + line)
+
+    print(f"{'mode':<6} {'path':<30} {'import ms':>10} {'first req ms':>13} {'total ms':>9} {'modules':>8}  status")
+    for path in args.paths.split(","):
+        for mode in ("eager", "lazy"):
+            runs = [sample(mode, path) for _ in range(args.runs)]
+            imp = statistics.median(r["import_ms"] for r in runs)
+            first = statistics.median(r["first_ms"] for r in runs)
+            print(f"{mode:<6} {path:<30} {imp:10.2f} {first:13.2f} {imp + first:9.2f} "
+                  f"{runs[0]['modules']:8d}  {runs[0]['status']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+`?format=columns` vs. one object per row, at 10k rows, on the local D1 stand-in.
+
+Two measurements:
+  serialize - D1 result -> JSON body for 10k users (6 columns): d1_all + to_py()
+              per row + json.dumps, vs. d1_raw + json.dumps of value arrays
+  endpoint  - GET /api/bookings/by-user/{telegram_id} for a user with 10k bookings,
+              through Default.fetch, in both formats
+
+Payload sizes are reported plain and gzipped (level 6, close to what the Workers
+runtime sends for `Content-Encoding: gzip`). Locally a row's to_py() is a dict
+copy; on Workers it converts a JS object per row, so the gap there is larger.
+
+    python bench/columns.py [--rows 10000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(HERE, "stubs"), os.path.join(HERE, "..", "src")]
+
+from workers import Request  # noqa: E402
+from local_d1 import LocalD1, make_env  # noqa: E402
+from load import seed, BASE_URL  # noqa: E402
+
+
+async def median_ms(fn, repeat: int) -> tuple[float, str]:
+    times, body = [], ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = await fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times), body
+
+
+def report(label: str, ms: float, body: str):
+    raw = body.encode()
+    print(f"{label:<40} {ms:9.2f} {len(raw) / 1024:10.1f} {len(gzip.compress(raw, 6)) / 1024:10.1f}")
+
+
+async def main_async(args):
+    from worker import Default
+    from app import admission
+    from app.db import d1_all, d1_raw
+    from app.encoding import columns_body
+    from app.endpoints.users import USERS_SELECT, USER_COLUMNS
+    admission.READ_BURST = admission.WRITE_BURST = float("inf")
+
+    db = LocalD1()
+    db.apply_migrations()
+    data = seed(db, args.rows, args.rows * 3, taken_ratio=1 / 3)
+    # Every taken slot goes to one user, so by-user returns args.rows bookings
+    db.conn.execute("UPDATE bookings SET user_id = ? WHERE user_id != ?", (data["user_ids"][0], data["admin_id"]))
+    db.conn.commit()
+    env = make_env(db)
+    worker = Default(None, env)
+    req = Request(BASE_URL + "/")
+    req.scope = {"env": env}
+    sql = f"{USERS_SELECT} ORDER BY id LIMIT ?"
+
+    async def as_rows():
+        rows = await d1_all(req, sql, args.rows)
+        return json.dumps([row.to_py() for row in rows], separators=(",", ":"))
+
+    async def as_columns():
+        rows = await d1_raw(req, sql, args.rows)
+        return json.dumps(columns_body(USER_COLUMNS, rows), separators=(",", ":"))
+
+    print(f"{'step':<40} {'p50 ms':>9} {'KiB':>10} {'gzip KiB':>10}")
+    report(f"serialize {args.rows} users, rows", *await median_ms(as_rows, args.repeat))
+    report(f"serialize {args.rows} users, columns", *await median_ms(as_columns, args.repeat))
+
+    telegram_id = db.conn.execute("SELECT telegram_id FROM users WHERE id = ?", (data["user_ids"][0],)).fetchone()[0]
+    for fmt in ("rows", "columns"):
+        url = f"{BASE_URL}/api/bookings/by-user/{telegram_id}" + ("?format=columns" if fmt == "columns" else "")
+
+        async def fetch():
+            resp = await worker.fetch(Request(url, headers={"Accept-Encoding": "gzip"}), env)
+            assert resp.status == 200 and resp.headers.get("Content-Encoding") == "gzip", resp.status
+            return await resp.text()
+
+        ms, body = await median_ms(fetch, args.repeat)
+        count = len(json.loads(body)["rows"] if fmt == "columns" else json.loads(body))
+        report(f"GET by-user ({count} bookings), {fmt}", ms, body)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=10_000)
+    ap.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main_async(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+End-to-end load benchmark for the Worker against the local D1 stand-in.
+
+Builds a SQLite database from migrations/, seeds users and bookings, then drives
+every route of app/endpoints/users.py through `Default.fetch` concurrently and
+reports latency percentiles and D1 round trips per request for each route.
+
+    python bench/load.py [--bookings 100000] [--requests 200] [--concurrency 20] [--d1-latency-ms 2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(HERE, "stubs"), os.path.join(HERE, "..", "src")]
+
+from workers import Request  # noqa: E402
+from local_d1 import LocalD1, make_env  # noqa: E402
+from app.endpoints.users import parse_slot  # noqa: E402
+
+BASE_URL = "http://localhost"
+TIMES = ["08:00", "09:00", "10:00", "11:00", "12:00", "13:00", "14:00", "15:00", "16:00", "17:00"]
+FIRST_DAY = date(2020, 1, 1)
+ADMIN_TELEGRAM_ID = 1
+
+
+def seed(db: LocalD1, users: int, bookings: int, taken_ratio: float = 0.3) -> dict:
+    conn = db.conn
+    conn.execute("INSERT INTO users (telegram_id, phone, name, role) VALUES (?, 'admin', 'Admin', 'admin')",
+                 (ADMIN_TELEGRAM_ID,))
+    conn.executemany("INSERT INTO users (telegram_id, phone, name, role) VALUES (?, ?, ?, 'user')",
+                     ((1000 + i, f"+7{i:010d}", f"user{i}") for i in range(users)))
+    admin_id = conn.execute("SELECT id FROM users WHERE role = 'admin'").fetchone()[0]
+    user_ids = [r[0] for r in conn.execute("SELECT id FROM users WHERE role = 'user' ORDER BY id")]
+
+    def rows():
+        step = max(1, round(1 / taken_ratio)) if taken_ratio else 0
+        for i in range(bookings):
+            day = FIRST_DAY + timedelta(days=i // len(TIMES))
+            owner = user_ids[i % len(user_ids)] if step and i % step == 0 else admin_id
+            yield owner, day.isoformat(), TIMES[i % len(TIMES)], parse_slot(day.isoformat(), TIMES[i % len(TIMES)])
+
+    conn.executemany("INSERT INTO bookings (user_id, date, time, slot_start) VALUES (?, ?, ?, ?)", rows())
+    conn.commit()
+    days = -(-bookings // len(TIMES))
+    return {"admin_id": admin_id, "user_ids": user_ids, "days": days,
+            "last_day": FIRST_DAY + timedelta(days=days - 1)}
+
+
+def request(method: str, path: str, body=None) -> Request:
+    return Request(BASE_URL + path, method=method,
+                   headers={"Content-Type": "application/json"} if body is not None else None,
+                   body=json.dumps(body) if body is not None else None)
+
+
+def scenarios(data: dict, db: LocalD1, n: int) -> dict:
+    """(method, route path) -> factory(i) -> Request. Write scenarios use fresh rows per request."""
+    conn = db.conn
+    user_ids = data["user_ids"]
+    tg = lambda i: 1000 + (i * 7919) % len(user_ids)  # noqa: E731
+    free = [r[0] for r in conn.execute(
+        "SELECT id FROM bookings WHERE user_id = ? ORDER BY id DESC LIMIT ?", (data["admin_id"], 3 * n))]
+    free_slots = [tuple(r) for r in conn.execute(
+        "SELECT date, time FROM bookings WHERE id IN (%s)" % ",".join(map(str, free[:n])))]
+    taken = [r[0] for r in conn.execute(
+        "SELECT id FROM bookings WHERE user_id != ? ORDER BY id LIMIT ?", (data["admin_id"], n))]
+    day = lambda i: (FIRST_DAY + timedelta(days=i % data["days"])).isoformat()  # noqa: E731
+    future = data["last_day"] + timedelta(days=1)
+
+    return {
+        ("GET", "/api/users"): lambda i: request("GET", "/api/users?limit=50"),
+        ("GET", "/api/users?telegram_id"): lambda i: request("GET", f"/api/users?telegram_id={tg(i)}"),
+        ("GET", "/api/users/{telegram_id}"): lambda i: request("GET", f"/api/users/{tg(i)}"),
+        ("POST", "/api/users"): lambda i: request("POST", "/api/users", {
+            "telegram_id": 10_000_000 + i, "phone": f"+9{i:010d}", "name": f"load{i}", "role": "user"}),
+        ("PUT", "/api/users/{id}"): lambda i: request("PUT", f"/api/users/{user_ids[i % len(user_ids)]}",
+                                                      {"name": f"renamed{i}"}),
+        ("DELETE", "/api/users/{telegram_id}"): lambda i: request("DELETE", f"/api/users/{10_000_000 + i}"),
+        ("GET", "/api/bookings/by-user/{telegram_id}"): lambda i: request("GET", f"/api/bookings/by-user/{tg(i)}"),
+        ("POST", "/api/bookings"): lambda i: request("POST", "/api/bookings", {
+            "user_id": user_ids[i % len(user_ids)], "date": free_slots[i % len(free_slots)][0],
+            "time": free_slots[i % len(free_slots)][1]}),
+        ("PUT", "/api/bookings/{id}/free"): lambda i: request("PUT", f"/api/bookings/{taken[i % len(taken)]}/free"),
+        ("DELETE", "/api/bookings/{id}"): lambda i: request("DELETE", f"/api/bookings/{free[-1 - i]}"),
+        ("GET", "/api/slots"): lambda i: request("GET", f"/api/slots?date={day(i)}"),
+        ("GET", "/api/slots?from&to"): lambda i: request("GET", f"/api/slots?from={day(i)}&to={day(i + 13)}"),
+        ("GET", "/api/available-dates"): lambda i: request("GET", "/api/available-dates"),
+        ("POST", "/api/generate-slots"): lambda i: request("POST", "/api/generate-slots", {
+            "from": (future + timedelta(days=31 * i)).isoformat(),
+            "to": (future + timedelta(days=31 * i + 30)).isoformat()}),
+        ("POST", "/api/bookings/bulk/free"): lambda i: request("POST", "/api/bookings/bulk/free", {"from": day(i)}),
+        ("POST", "/api/bookings/bulk/delete"): lambda i: request("POST", "/api/bookings/bulk/delete", {
+            "ids": [free[n + i]], "only_free": True}),
+        ("POST", "/api/bookings/bulk/reassign"): lambda i: request("POST", "/api/bookings/bulk/reassign", {
+            "ids": [taken[i % len(taken)]], "user_id": user_ids[(i + 1) % len(user_ids)]}),
+        ("OPTIONS", "/{any}"): lambda i: request("OPTIONS", "/health"),
+    }
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def drive(worker, env, db: LocalD1, make, n: int, concurrency: int) -> dict:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    statuses: dict[int, int] = {}
+
+    async def one(i):
+        req = make(i)
+        async with sem:
+            start = time.perf_counter()
+            resp = await worker.fetch(req, env)
+            latencies.append((time.perf_counter() - start) * 1000)
+        statuses[resp.status] = statuses.get(resp.status, 0) + 1
+
+    db.reset_counters()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+    return {
+        "p50": percentile(latencies, 50), "p95": percentile(latencies, 95), "p99": percentile(latencies, 99),
+        "rps": n / elapsed, "round_trips": db.round_trips / n, "statements": db.statements / n,
+        "statuses": statuses,
+    }
+
+
+def uncovered_routes(covered) -> list[str]:
+    from app import router
+    from app.endpoints import users  # noqa: F401
+    paths = {(m, p.split("?")[0]) for m, p in covered}
+    return [f"{m} {p}" for m, p, *_rest, fn, _meta in router._routes
+            if fn.__module__ == "app.endpoints.users" and (m, p) not in paths]
+
+
+async def main_async(args):
+    from worker import Default
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = LocalD1(args.db or os.path.join(tmp, "bench.sqlite"))
+        db.apply_migrations()
+        start = time.perf_counter()
+        data = seed(db, args.users, args.bookings)
+        print(f"seeded {args.users} users, {args.bookings} bookings in {time.perf_counter() - start:.1f}s")
+        db.latency = args.d1_latency_ms / 1000.0
+
+        env = make_env(db)
+        worker = Default(None, env)
+        # every scenario comes from one client; measure the routes, not the per-client limiter
+        from app import admission
+        admission.READ_BURST = admission.WRITE_BURST = float("inf")
+        plan = scenarios(data, db, args.requests)
+        missing = uncovered_routes(plan)
+        if missing:
+            print("routes without a scenario:", ", ".join(missing))
+
+        print(f"{'route':<44} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'D1/req':>7}  statuses")
+        for (method, path), make in plan.items():
+            if args.only and args.only not in path:
+                continue
+            r = await drive(worker, env, db, make, args.requests, args.concurrency)
+            print(f"{method + ' ' + path:<44} {r['p50']:8.2f} {r['p95']:8.2f} {r['p99']:8.2f} "
+                  f"{r['rps']:8.0f} {r['round_trips']:7.2f}  {r['statuses']}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=5_000)
+    ap.add_argument("--bookings", type=int, default=100_000)
+    ap.add_argument("--requests", type=int, default=200, help="requests per route")
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--d1-latency-ms", type=float, default=0.0,
+                    help="artificial delay per D1 round trip (real D1 is a network hop away)")
+    ap.add_argument("--only", help="run only routes whose path contains this string")
+    ap.add_argument("--db", help="SQLite file to use instead of a temporary one")
+    asyncio.run(main_async(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Local stand-in for the D1 binding (`env.DB`), backed by stdlib sqlite3.
+
+Mirrors the part of the D1 API the worker uses: prepare/bind, all/first/run/raw
+and batch. Every call counts as one round trip, and an optional artificial
+latency is awaited per round trip so that saving queries shows up in timings.
+"""
+import asyncio
+import glob
+import os
+import sqlite3
+from types import SimpleNamespace
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MIGRATIONS_DIR = os.path.join(ROOT, "migrations")
+
+
+class Row(dict):
+    """Result row; `to_py()` like the JsProxy rows returned on Workers."""
+
+    def to_py(self):
+        return dict(self)
+
+
+class Statement:
+    def __init__(self, db: "LocalD1", sql: str, params: tuple = ()):
+        self._db = db
+        self.sql = sql
+        self.params = params
+
+    def bind(self, *params):
+        return Statement(self._db, self.sql, params)
+
+    def _execute(self):
+        cur = self._db.conn.execute(self.sql, self.params)
+        cols = [d[0] for d in cur.description or ()]
+        rows = cur.fetchall()
+        # direct changes only, like D1's meta.changes (trigger writes are not counted)
+        meta = SimpleNamespace(changes=max(cur.rowcount, 0), last_row_id=cur.lastrowid)
+        self._db.statements += 1
+        return SimpleNamespace(results=[Row(zip(cols, r)) for r in rows], success=True, meta=meta,
+                               rows=rows)
+
+    async def _round_trip(self):
+        await self._db.wait()
+        try:
+            res = self._execute()
+            self._db.conn.commit()
+        except Exception:
+            self._db.conn.rollback()
+            raise
+        return res
+
+    async def all(self):
+        return await self._round_trip()
+
+    async def run(self):
+        return await self._round_trip()
+
+    async def first(self, column: str | None = None):
+        res = await self._round_trip()
+        if not res.results:
+            return None
+        return res.results[0][column] if column else res.results[0]
+
+    async def raw(self):
+        return [list(r) for r in (await self._round_trip()).rows]
+
+
+class LocalD1:
+    def __init__(self, path: str = ":memory:", latency_ms: float = 0.0):
+        self.conn = sqlite3.connect(path, isolation_level="DEFERRED", check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.latency = latency_ms / 1000.0
+        self.round_trips = 0
+        self.statements = 0
+
+    async def wait(self):
+        self.round_trips += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def prepare(self, sql: str) -> Statement:
+        return Statement(self, sql)
+
+    async def batch(self, statements):
+        """All statements in one round trip and one transaction, like D1 batch()."""
+        await self.wait()
+        try:
+            results = [stmt._execute() for stmt in statements]
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return results
+
+    async def exec(self, sql: str):
+        await self.wait()
+        self.conn.executescript(sql)
+
+    # -------------------------------
+    # Setup helpers (synchronous, not counted)
+    # -------------------------------
+    def apply_migrations(self, directory: str = MIGRATIONS_DIR) -> list[str]:
+        """Apply migrations/*.sql in order and record them like `wrangler d1 migrations apply`."""
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS d1_migrations("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, "
+            "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL)"
+        )
+        done = {r[0] for r in self.conn.execute("SELECT name FROM d1_migrations")}
+        applied = []
+        for path in sorted(glob.glob(os.path.join(directory, "*.sql"))):
+            name = os.path.basename(path)
+            if name in done:
+                continue
+            try:
+                self.conn.executescript(open(path, encoding="utf-8").read())
+            except sqlite3.OperationalError as e:
+                # 0002 and 0008 both create `bookings`; the deployed DB has the same history
+                if "already exists" not in str(e):
+                    raise
+            self.conn.execute("INSERT INTO d1_migrations (name) VALUES (?)", (name,))
+            applied.append(name)
+        self.conn.commit()
+        return applied
+
+    def reset_counters(self):
+        self.round_trips = 0
+        self.statements = 0
+
+
+def make_env(db: LocalD1, **vars):
+    return SimpleNamespace(DB=db, **vars)
+
@@ -0,0 +1,60 @@
+"""
+Stand-in for the Cloudflare `workers` module so benchmarks can import the
+worker code with plain CPython. Only the surface used by src/ is provided.
+"""
+import json
+
+
+class Headers(dict):
+    """Case-insensitive like the JS Headers object."""
+
+    def __init__(self, items=None):
+        super().__init__()
+        for k, v in (items or {}).items():
+            self[k] = v
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key.lower(), value)
+
+    def __getitem__(self, key):
+        return super().__getitem__(key.lower())
+
+    def __contains__(self, key):
+        return super().__contains__(key.lower())
+
+    def get(self, key, default=None):
+        return super().get(key.lower(), default)
+
+
+class Request:
+    def __init__(self, url: str, method: str = "GET", headers: dict | None = None, body=None):
+        self.url = url
+        self.method = method.upper()
+        self.headers = Headers(headers)
+        self._body = body
+
+    async def text(self) -> str:
+        if self._body is None:
+            return ""
+        return self._body.decode() if isinstance(self._body, bytes) else str(self._body)
+
+    async def json(self):
+        return json.loads(await self.text())
+
+
+class Response:
+    def __init__(self, body="", status: int = 200, headers: dict | None = None):
+        self.body = body
+        self.status = status
+        self.headers = Headers(headers)
+
+    async def text(self) -> str:
+        if self.body is None:
+            return ""
+        return self.body.decode() if isinstance(self.body, bytes) else str(self.body)
+
+
+class WorkerEntrypoint:
+    def __init__(self, ctx=None, env=None):
+        self.ctx = ctx
+        self.env = env
@@ -0,0 +1,107 @@
+"""
+NDJSON export/import benchmark against the local D1 stand-in.
+
+Seeds a source database (bench/load.py seed), exports users and bookings with
+GET /api/export/{kind}, imports them into an empty database with
+POST /api/import/{kind} at several batch sizes, checks the row counts, and for
+comparison creates a sample of users one POST /api/users at a time.
+
+    python bench/transfer.py [--users 10000] [--bookings 100000] [--batch-sizes 100,500,2000]
+                             [--d1-latency-ms 2]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(HERE, "stubs"), os.path.join(HERE, "..", "src")]
+
+from workers import Request  # noqa: E402
+from local_d1 import LocalD1, make_env  # noqa: E402
+from load import seed, BASE_URL  # noqa: E402
+
+
+async def timed(worker, env, db: LocalD1, req: Request):
+    db.reset_counters()
+    tracemalloc.start()
+    start = time.perf_counter()
+    resp = await worker.fetch(req, env)
+    text = await resp.text()
+    elapsed = time.perf_counter() - start
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resp, text, elapsed, peak, db.round_trips
+
+
+async def main_async(args):
+    import json
+    from worker import Default
+    from app import admission
+    admission.READ_BURST = admission.WRITE_BURST = float("inf")
+
+    source = LocalD1()
+    source.apply_migrations()
+    seed(source, args.users, args.bookings)
+    source.latency = args.d1_latency_ms / 1000.0
+    src_env = make_env(source)
+    src = Default(None, src_env)
+
+    dumps = {}
+    print(f"{'step':<34} {'rows':>8} {'seconds':>8} {'rows/s':>9} {'D1 trips':>9} {'peak MiB':>9}")
+    for kind in ("users", "bookings"):
+        resp, text, elapsed, peak, trips = await timed(src, src_env, source,
+                                                       Request(f"{BASE_URL}/api/export/{kind}"))
+        dumps[kind] = text
+        rows = text.count("\n")
+        print(f"{'export ' + kind:<34} {rows:8d} {elapsed:8.2f} {rows / elapsed:9.0f} {trips:9d} {peak / 2**20:9.1f}")
+
+    for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+        target = LocalD1()
+        target.apply_migrations()
+        target.latency = args.d1_latency_ms / 1000.0
+        env = make_env(target)
+        dst = Default(None, env)
+        for kind in ("users", "bookings"):
+            resp, text, elapsed, peak, trips = await timed(dst, env, target, Request(
+                f"{BASE_URL}/api/import/{kind}?batch_size={batch_size}", method="POST", body=dumps[kind]))
+            report = json.loads(text)
+            label = f"import {kind} batch_size={batch_size}"
+            print(f"{label:<34} {report['imported']:8d} {elapsed:8.2f} {report['imported'] / elapsed:9.0f} "
+                  f"{trips:9d} {peak / 2**20:9.1f}" + (f"  failed={report['failed']}" if report["failed"] else ""))
+        for table in ("users", "bookings"):
+            want = source.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            got = target.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            if want != got:
+                print(f"  MISMATCH {table}: source {want}, imported {got}")
+
+    # The old way: one POST /api/users per record
+    target = LocalD1()
+    target.apply_migrations()
+    target.latency = args.d1_latency_ms / 1000.0
+    env = make_env(target)
+    dst = Default(None, env)
+    lines = dumps["users"].splitlines()[:args.one_by_one]
+    target.reset_counters()
+    start = time.perf_counter()
+    for line in lines:
+        await dst.fetch(Request(f"{BASE_URL}/api/users", method="POST", body=line), env)
+    elapsed = time.perf_counter() - start
+    print(f"{'POST /api/users one by one':<34} {len(lines):8d} {elapsed:8.2f} {len(lines) / elapsed:9.0f} "
+          f"{target.round_trips:9d} {'':>9}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=10_000)
+    ap.add_argument("--bookings", type=int, default=100_000)
+    ap.add_argument("--batch-sizes", default="100,500,2000")
+    ap.add_argument("--one-by-one", type=int, default=1000, help="users created with single POSTs for comparison")
+    ap.add_argument("--d1-latency-ms", type=float, default=0.0)
+    asyncio.run(main_async(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+-- Migration number: 0009 	 2026-10-18T09:00:00.000Z
+-- Free slots are the admin's bookings: GET /api/slots filters by user_id and a date range
+CREATE INDEX IF NOT EXISTS idx_bookings_user_date_time ON bookings(user_id, date, time);
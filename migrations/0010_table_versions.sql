@@ -0,0 +1,23 @@
+-- Migration number: 0010 	 2026-10-18T09:10:00.000Z
+-- Per-table change counters for ETags: bumped by triggers on every write,
+-- so a read endpoint can answer 304 after reading one tiny table.
+CREATE TABLE IF NOT EXISTS table_versions (
+  name TEXT PRIMARY KEY,
+  version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO table_versions (name, version) VALUES ('users', 0), ('bookings', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_users_version_insert AFTER INSERT ON users
+BEGIN UPDATE table_versions SET version = version + 1 WHERE name = 'users'; END;
+CREATE TRIGGER IF NOT EXISTS trg_users_version_update AFTER UPDATE ON users
+BEGIN UPDATE table_versions SET version = version + 1 WHERE name = 'users'; END;
+CREATE TRIGGER IF NOT EXISTS trg_users_version_delete AFTER DELETE ON users
+BEGIN UPDATE table_versions SET version = version + 1 WHERE name = 'users'; END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_version_insert AFTER INSERT ON bookings
+BEGIN UPDATE table_versions SET version = version + 1 WHERE name = 'bookings'; END;
+CREATE TRIGGER IF NOT EXISTS trg_bookings_version_update AFTER UPDATE ON bookings
+BEGIN UPDATE table_versions SET version = version + 1 WHERE name = 'bookings'; END;
+CREATE TRIGGER IF NOT EXISTS trg_bookings_version_delete AFTER DELETE ON bookings
+BEGIN UPDATE table_versions SET version = version + 1 WHERE name = 'bookings'; END;
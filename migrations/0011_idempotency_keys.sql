@@ -0,0 +1,13 @@
+-- Migration number: 0011 	 2026-10-18T09:20:00.000Z
+-- Stored responses for requests sent with an Idempotency-Key header.
+-- expires_at is epoch seconds; the Worker's scheduled handler deletes expired rows.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+  key TEXT PRIMARY KEY,
+  request_hash TEXT NOT NULL,
+  status INTEGER NOT NULL,
+  body TEXT NOT NULL,
+  content_type TEXT NOT NULL DEFAULT 'application/json',
+  expires_at INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(expires_at);
@@ -0,0 +1,50 @@
+-- Migration number: 0012 	 2026-10-18T09:30:00.000Z
+-- Per-date slot counters for GET /api/available-dates. A slot is free while it
+-- belongs to the admin. Triggers keep the counters in the same transaction as
+-- every write to bookings (generate, claim, free, delete, batch, bulk).
+CREATE TABLE IF NOT EXISTS slot_days (
+  date TEXT PRIMARY KEY,
+  total INTEGER NOT NULL DEFAULT 0,
+  free INTEGER NOT NULL DEFAULT 0
+);
+
+DELETE FROM slot_days;
+INSERT INTO slot_days (date, total, free)
+SELECT date, COUNT(*), SUM(user_id IS (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1))
+FROM bookings GROUP BY date;
+
+CREATE TRIGGER IF NOT EXISTS trg_slot_days_insert AFTER INSERT ON bookings
+BEGIN
+  INSERT INTO slot_days (date, total, free)
+  VALUES (NEW.date, 1, NEW.user_id IS (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1))
+  ON CONFLICT(date) DO UPDATE SET total = total + 1, free = free + excluded.free;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_slot_days_delete AFTER DELETE ON bookings
+BEGIN
+  UPDATE slot_days
+  SET total = total - 1,
+      free = free - (OLD.user_id IS (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1))
+  WHERE date = OLD.date;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_slot_days_update AFTER UPDATE OF user_id, date ON bookings
+BEGIN
+  UPDATE slot_days
+  SET total = total - 1,
+      free = free - (OLD.user_id IS (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1))
+  WHERE date = OLD.date;
+  INSERT INTO slot_days (date, total, free)
+  VALUES (NEW.date, 1, NEW.user_id IS (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1))
+  ON CONFLICT(date) DO UPDATE SET total = total + 1, free = free + excluded.free;
+END;
+
+-- Another user becoming (or ceasing to be) the admin changes which slots are free: recount
+CREATE TRIGGER IF NOT EXISTS trg_slot_days_admin_update AFTER UPDATE OF role ON users
+WHEN OLD.role IS NOT NEW.role AND (OLD.role = 'admin' OR NEW.role = 'admin')
+BEGIN
+  DELETE FROM slot_days;
+  INSERT INTO slot_days (date, total, free)
+  SELECT date, COUNT(*), SUM(user_id IS (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1))
+  FROM bookings GROUP BY date;
+END;
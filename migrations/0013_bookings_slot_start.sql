@@ -0,0 +1,27 @@
+-- Migration number: 0013 	 2026-10-18T09:40:00.000Z
+-- Integer slot timestamp: minutes since the Unix epoch, UTC, parsed from date + time.
+-- Ordering and range queries compare integers and scan an index; date/time stay
+-- as the API representation. Rows whose date/time do not parse keep NULL.
+ALTER TABLE bookings ADD COLUMN slot_start INTEGER;
+
+UPDATE bookings SET slot_start = CAST(strftime('%s', date || ' ' || time) AS INTEGER) / 60
+WHERE slot_start IS NULL;
+
+-- Free slots (admin's rows) by range, a user's bookings in order, any slot by range
+CREATE INDEX IF NOT EXISTS idx_bookings_user_slot_start ON bookings(user_id, slot_start);
+CREATE INDEX IF NOT EXISTS idx_bookings_slot_start ON bookings(slot_start);
+DROP INDEX IF EXISTS idx_bookings_user_date_time;
+
+-- The API sets slot_start itself; these cover writes made outside it (wrangler d1 execute, seeds)
+CREATE TRIGGER IF NOT EXISTS trg_bookings_slot_start_insert AFTER INSERT ON bookings
+WHEN NEW.slot_start IS NULL
+BEGIN
+  UPDATE bookings SET slot_start = CAST(strftime('%s', NEW.date || ' ' || NEW.time) AS INTEGER) / 60
+  WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_bookings_slot_start_update AFTER UPDATE OF date, time ON bookings
+BEGIN
+  UPDATE bookings SET slot_start = CAST(strftime('%s', NEW.date || ' ' || NEW.time) AS INTEGER) / 60
+  WHERE id = NEW.id;
+END;
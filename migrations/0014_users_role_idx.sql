@@ -0,0 +1,5 @@
+-- Migration number: 0014 	 2026-10-18T09:50:00.000Z
+-- "The admin" (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1) is looked up by
+-- every claim, free, bulk statement and by the slot_days triggers for each booking row written;
+-- without an index that is a scan of users each time (bulk imports spent most of their time here).
+CREATE INDEX IF NOT EXISTS idx_users_role ON users(role, id);
@@ -0,0 +1,20 @@
+-- Migration number: 0015 	 2026-10-18T10:00:00.000Z
+-- The admin recount in 0012 only ran when a role changed. Adding or deleting an admin
+-- also changes which user is "the admin" (lowest id) and with it which slots are free.
+CREATE TRIGGER IF NOT EXISTS trg_slot_days_admin_insert AFTER INSERT ON users
+WHEN NEW.role = 'admin'
+BEGIN
+  DELETE FROM slot_days;
+  INSERT INTO slot_days (date, total, free)
+  SELECT date, COUNT(*), SUM(user_id IS (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1))
+  FROM bookings GROUP BY date;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_slot_days_admin_delete AFTER DELETE ON users
+WHEN OLD.role = 'admin'
+BEGIN
+  DELETE FROM slot_days;
+  INSERT INTO slot_days (date, total, free)
+  SELECT date, COUNT(*), SUM(user_id IS (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1))
+  FROM bookings GROUP BY date;
+END;
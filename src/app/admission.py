@@ -0,0 +1,125 @@
+# src/app/admission.py
+"""
+Per-client admission control, checked in Default.dispatch after the route match.
+
+Every client gets two in-isolate token buckets, one for reads and one for
+writes; an empty bucket is a 429 with Retry-After. A client is the connecting
+IP (CF-Connecting-IP): telegram ids in the path, the query or X-Telegram-Id are
+chosen by the caller and are only used as the key when the request carries the
+bot's X-Bot-Key (the BOT_API_KEY secret), so the bot's users get their own
+budgets instead of sharing the bot's IP. A request costs one token; handlers
+that do several writes in one request charge() the rest afterwards (a batch
+one per operation, an NDJSON import one per statement), which can leave the
+bucket in debt so the client's next writes wait for it to refill. While the smoothed D1 latency is above
+SHED_D1_LATENCY_MS, reads not marked `critical=True` on @route are shed with a
+503 before they reach D1. Rejections are counted in /metrics.
+"""
+import hmac, json, math, time
+from collections import OrderedDict
+from workers import Request, Response  # type: ignore
+from . import metrics
+from .router import context
+from .db import get_env
+
+# tokens per second, bucket size
+READ_RATE, READ_BURST = 10.0, 40.0
+WRITE_RATE, WRITE_BURST = 2.0, 10.0
+# Buckets kept per isolate; the least recently seen clients are dropped first
+MAX_CLIENTS = 10_000
+SHED_D1_LATENCY_MS = 250.0
+SHED_RETRY_AFTER = 5  # seconds
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take one token; 0 if allowed, else seconds until one is available."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def charge(self, cost: float, now: float) -> None:
+        """Take `cost` tokens unconditionally; the balance may go negative."""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate) - cost
+        self.updated = now
+
+
+# (client, "read"|"write") -> bucket
+_buckets: "OrderedDict[tuple[str, str], TokenBucket]" = OrderedDict()
+
+
+def from_bot(req: Request) -> bool:
+    """X-Bot-Key matches the BOT_API_KEY secret (`wrangler secret put BOT_API_KEY`)."""
+    headers = getattr(req, "headers", None)
+    given = headers.get("X-Bot-Key") if headers is not None else None
+    expected = getattr(get_env(req), "BOT_API_KEY", None)
+    return bool(given and expected) and hmac.compare_digest(str(given), str(expected))
+
+
+def client_key(req: Request, params: dict | None) -> str:
+    headers = getattr(req, "headers", None)
+    if from_bot(req):
+        telegram_id = ((params or {}).get("telegram_id") or context(req).query.get("telegram_id")
+                       or (headers.get("X-Telegram-Id") if headers is not None else None))
+        if telegram_id:
+            return f"tg:{telegram_id}"
+    ip = headers.get("CF-Connecting-IP") if headers is not None else None
+    return f"ip:{ip}" if ip else "anonymous"
+
+
+def _bucket(key: tuple[str, str], now: float) -> TokenBucket:
+    bucket = _buckets.get(key)
+    if bucket is None:
+        rate, burst = (READ_RATE, READ_BURST) if key[1] == "read" else (WRITE_RATE, WRITE_BURST)
+        bucket = _buckets[key] = TokenBucket(rate, burst, now)
+        if len(_buckets) > MAX_CLIENTS:
+            _buckets.popitem(last=False)
+    else:
+        _buckets.move_to_end(key)
+    return bucket
+
+
+def _reject(status: int, error: str, retry_after: float) -> Response:
+    return Response(json.dumps({"error": error}), status=status, headers={
+        "Content-Type": "application/json",
+        "Retry-After": str(max(1, math.ceil(retry_after))),
+    })
+
+
+def admit(req: Request, method: str, meta: dict, params: dict | None) -> Response | None:
+    """None to let the request through, otherwise the 429/503 to send instead."""
+    kind = "read" if method in ("GET", "HEAD") else "write"
+    if kind == "read" and not meta.get("critical") and metrics.d1_latency_ms() > SHED_D1_LATENCY_MS:
+        metrics.inc("admission_rejected_total", reason="shed", kind=kind)
+        return _reject(503, "Overloaded, retry later", SHED_RETRY_AFTER)
+
+    now = time.monotonic()
+    key = (client_key(req, params), kind)
+    scope = getattr(req, "scope", None)
+    if isinstance(scope, dict):
+        scope["admission_key"] = key
+    wait = _bucket(key, now).take(now)
+    if wait:
+        metrics.inc("admission_rejected_total", reason="rate_limit", kind=kind)
+        return _reject(429, "Too many requests", wait)
+    return None
+
+
+def charge(req: Request, cost: float) -> None:
+    """Extra tokens for a request admit() let through, from the same client's bucket."""
+    scope = getattr(req, "scope", None)
+    key = scope.get("admission_key") if isinstance(scope, dict) else None
+    if key is None or cost <= 0:
+        return
+    now = time.monotonic()
+    _bucket(key, now).charge(cost, now)
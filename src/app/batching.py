@@ -0,0 +1,62 @@
+# src/app/batching.py
+"""
+Statement plans for operations that can run inside one D1 batch.
+
+A plan is the SQL an endpoint needs plus a function that turns the statement
+results into (status, body). Endpoints register plans with @batch_plan so
+POST /api/batch can put several operations into one D1 batch (one round trip,
+one transaction); the endpoints themselves execute the same plan via run_plan.
+"""
+from typing import Any, Callable
+from workers import Request  # type: ignore
+from .db import d1_batch, d1_rows, d1_changes
+
+# (rows, changes) per statement -> (status, body)
+Finish = Callable[[list[tuple[list[dict], int]]], tuple[int, Any]]
+
+
+class PlanError(ValueError):
+    """The operation is invalid; reported as 400 without touching D1."""
+
+
+class Plan:
+    __slots__ = ("statements", "finish")
+
+    def __init__(self, statements: list[tuple[str, tuple]], finish: Finish):
+        self.statements = statements
+        self.finish = finish
+
+
+# (METHOD, route path template) -> planner(params, body) -> Plan
+_batch_plans: dict[tuple[str, str], Callable[[dict, dict], Plan]] = {}
+
+
+def batch_plan(method: str, path: str):
+    def decorator(fn: Callable[[dict, dict], Plan]):
+        _batch_plans[(method.upper(), path)] = fn
+        return fn
+    return decorator
+
+
+def planner_for(method: str, path: str):
+    return _batch_plans.get((method.upper(), path))
+
+
+def split_results(plans: list[Plan], results: list) -> list[tuple[int, Any]]:
+    """Hand each plan its slice of a combined batch result."""
+    out, i = [], 0
+    for plan in plans:
+        n = len(plan.statements)
+        out.append(plan.finish([(d1_rows(r), d1_changes(r)) for r in results[i:i + n]]))
+        i += n
+    return out
+
+
+async def run_plans(req: Request, plans: list[Plan]) -> list[tuple[int, Any]]:
+    statements = [stmt for plan in plans for stmt in plan.statements]
+    results = await d1_batch(req, statements)
+    return split_results(plans, results)
+
+
+async def run_plan(req: Request, plan: Plan) -> tuple[int, Any]:
+    return (await run_plans(req, [plan]))[0]
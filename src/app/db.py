@@ -1,41 +1,246 @@
 # src/app/db.py
 from workers import Request  # type: ignore
+from collections import OrderedDict
+import asyncio, re, time
+from .schema import mark_stale
+from .metrics import timer_of, observe_d1
 
 def get_env(req: Request):
     scope = getattr(req, "scope", None)
-    print("🔍 scope in get_env:", scope)
     return scope.get("env") if isinstance(scope, dict) else None
 
 
 
+# -------------------------------
+# Piggybacked statements
+# -------------------------------
+# A statement queued with piggyback() goes out with the request's next D1 query
+# in one batch (or concurrently with a raw() read, which batch() cannot do), so it
+# costs no round trip of its own (http_cache uses it for the table_versions lookup
+# behind ETags).
+
+def piggyback(req: Request, sql: str, *params) -> None:
+    scope = getattr(req, "scope", None)
+    if isinstance(scope, dict):
+        scope["piggyback"] = {"sql": sql, "params": params, "sent": False, "rows": None}
+
+def piggyback_rows(req: Request) -> list[dict] | None:
+    """Rows of the piggybacked statement; None (and it is dropped) if no D1 query has carried it."""
+    scope = getattr(req, "scope", None)
+    entry = scope.pop("piggyback", None) if isinstance(scope, dict) else None
+    return entry["rows"] if entry else None
+
+def _take_piggyback(req: Request) -> dict | None:
+    scope = getattr(req, "scope", None)
+    entry = scope.get("piggyback") if isinstance(scope, dict) else None
+    if entry is None or entry["sent"]:
+        return None
+    entry["sent"] = True
+    return entry
+
+async def _with_piggyback(req: Request, entry: dict, sql: str, params: tuple):
+    extra, res = await d1_batch(req, [(entry["sql"], entry["params"]), (sql, params)])
+    entry["rows"] = d1_rows(extra)
+    return res
+
 async def d1_all(req: Request, sql: str, *params):
+    entry = _take_piggyback(req)
+    if entry is not None:
+        return (await _with_piggyback(req, entry, sql, params)).results
     env = get_env(req)
     stmt = env.DB.prepare(sql)
     if params:
         stmt = stmt.bind(*params)
-    res = await stmt.all()
+    started = time.perf_counter()
+    try:
+        res = await stmt.all()
+    except Exception:
+        mark_stale()
+        raise
+    finally:
+        _record(req, started)
+    _invalidate_written(sql)
     # Cloudflare's Python D1 returns an object with `.results`
     return res.results
 
+async def d1_raw(req: Request, sql: str, *params) -> list[list]:
+    """
+    Rows as value arrays in SELECT order (D1 `raw()`): one conversion of the whole
+    result instead of a dict per row. The caller knows the column order.
+    """
+    entry = _take_piggyback(req)
+    if entry is not None:
+        # batch() has no raw mode: the piggybacked statement runs alongside instead
+        extra, rows = await asyncio.gather(d1_all(req, entry["sql"], *entry["params"]), _raw(req, sql, params))
+        entry["rows"] = [_to_py(r) for r in extra]
+        return rows
+    return await _raw(req, sql, params)
+
+async def _raw(req: Request, sql: str, params: tuple) -> list[list]:
+    env = get_env(req)
+    stmt = env.DB.prepare(sql)
+    if params:
+        stmt = stmt.bind(*params)
+    started = time.perf_counter()
+    try:
+        rows = await stmt.raw()
+    except Exception:
+        mark_stale()
+        raise
+    finally:
+        _record(req, started)
+    _invalidate_written(sql)
+    # In Pyodide this is a JS array of arrays; the local stand-in returns lists
+    return rows.to_py() if hasattr(rows, "to_py") else rows
+
 async def d1_run(req: Request, sql: str, *params):
     """
     Execute a statement where we don't need rows back.
     Some drivers support `.run()`. If not present, `.all()` still executes.
     """
     env = get_env(req)
-    print("🔍 env in create_user:", env)
-    print("🔍 env.DB in create_user:", getattr(env, "DB", None))
-
     stmt = env.DB.prepare(sql)
     if params:
         stmt = stmt.bind(*params)
     run = getattr(stmt, "run", None)
-    if callable(run):
-        return await run()
-    else:
-        # Fallback: force execution
-        return await stmt.all()
+    started = time.perf_counter()
+    try:
+        if callable(run):
+            res = await run()
+        else:
+            # Fallback: force execution
+            res = await stmt.all()
+    except Exception:
+        mark_stale()
+        raise
+    finally:
+        _record(req, started)
+    _invalidate_written(sql)
+    return res
+
+def _js_list(items: list):
+    """D1 batch() wants a JS array; outside Pyodide (local stand-in) a list is fine."""
+    try:
+        from pyodide.ffi import to_js  # type: ignore
+    except ImportError:
+        return items
+    return to_js(items)
+
+async def d1_batch(req: Request, statements: list[tuple[str, tuple]]):
+    """
+    Run [(sql, params), ...] in one round trip. D1 executes a batch as a single
+    transaction: if any statement fails, none of them is applied.
+    Returns the D1 result of each statement, in order.
+    """
+    entry = _take_piggyback(req)
+    if entry is not None:
+        statements = [(entry["sql"], entry["params"]), *statements]
+    env = get_env(req)
+    prepared = []
+    for sql, params in statements:
+        stmt = env.DB.prepare(sql)
+        prepared.append(stmt.bind(*params) if params else stmt)
+    started = time.perf_counter()
+    try:
+        results = await env.DB.batch(_js_list(prepared))
+    except Exception:
+        mark_stale()
+        raise
+    finally:
+        _record(req, started)
+    for sql, _params in statements:
+        _invalidate_written(sql)
+    results = list(results)
+    if entry is not None:
+        entry["rows"] = d1_rows(results.pop(0))
+    return results
+
+def d1_rows(res) -> list[dict]:
+    return [_to_py(r) for r in (getattr(res, "results", None) or [])]
+
+def _record(req: Request, started: float) -> None:
+    elapsed = time.perf_counter() - started
+    observe_d1(elapsed)
+    timer = timer_of(req)
+    if timer is not None:
+        timer.record_d1(elapsed)
 
 async def d1_first(req: Request, sql: str, *params):
     rows = await d1_all(req, sql, *params)
-    return rows[0] if rows else None
\ No newline at end of file
+    return rows[0] if rows else None
+
+def d1_changes(res) -> int:
+    """Rows changed by a statement, from the D1 result `meta` (0 if unavailable)."""
+    meta = getattr(res, "meta", None)
+    return int(getattr(meta, "changes", 0) or 0)
+
+# -------------------------------
+# Per-isolate read-through cache
+# -------------------------------
+# Entries are keyed by normalized SQL + params and hold plain Python rows.
+# Writes made through this module drop every entry that reads the written table;
+# writes from other isolates are only bounded by the TTL, so cache reference
+# data (admin id, telegram_id -> id), not rows users expect to see change.
+CACHE_MAX_ENTRIES = 512
+CACHE_DEFAULT_TTL = 60.0
+
+_cache: "OrderedDict[tuple, tuple[float, frozenset[str], object]]" = OrderedDict()
+_cache_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+_READ_TABLES_RE = re.compile(r"\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)", re.IGNORECASE)
+_WRITE_TABLE_RE = re.compile(
+    r"^\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?|DELETE\s+FROM)\s+([A-Za-z_]\w*)",
+    re.IGNORECASE,
+)
+
+def _to_py(row):
+    return row.to_py() if hasattr(row, "to_py") else row
+
+def _invalidate_written(sql: str) -> None:
+    m = _WRITE_TABLE_RE.match(sql)
+    if m:
+        invalidate_tables(m.group(1))
+
+def invalidate_tables(*tables: str) -> None:
+    names = {t.lower() for t in tables}
+    stale = [k for k, (_exp, deps, _v) in _cache.items() if deps & names]
+    for k in stale:
+        del _cache[k]
+    _cache_stats["invalidations"] += len(stale)
+
+def _cache_get(key):
+    entry = _cache.get(key)
+    if entry is None:
+        return False, None
+    if entry[0] < time.monotonic():
+        del _cache[key]
+        return False, None
+    _cache.move_to_end(key)
+    return True, entry[2]
+
+def _cache_put(key, sql: str, value, ttl: float) -> None:
+    deps = frozenset(t.lower() for t in _READ_TABLES_RE.findall(sql))
+    _cache[key] = (time.monotonic() + ttl, deps, value)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+        _cache_stats["evictions"] += 1
+
+async def d1_all_cached(req: Request, sql: str, *params, ttl: float = CACHE_DEFAULT_TTL) -> list[dict]:
+    """Like d1_all, but served from the isolate cache; rows come back as dicts."""
+    key = (" ".join(sql.split()), params)
+    hit, value = _cache_get(key)
+    if hit:
+        _cache_stats["hits"] += 1
+        return value
+    _cache_stats["misses"] += 1
+    rows = [_to_py(r) for r in await d1_all(req, sql, *params)]
+    _cache_put(key, sql, rows, ttl)
+    return rows
+
+async def d1_first_cached(req: Request, sql: str, *params, ttl: float = CACHE_DEFAULT_TTL) -> dict | None:
+    rows = await d1_all_cached(req, sql, *params, ttl=ttl)
+    return rows[0] if rows else None
+
+def cache_stats() -> dict:
+    return {**_cache_stats, "entries": len(_cache)}
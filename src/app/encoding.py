@@ -0,0 +1,66 @@
+# src/app/encoding.py
+"""
+Compact list responses and compression.
+
+`?format=columns` answers a list endpoint with the column names once and the
+rows as value arrays, read with D1 `raw()` so no dict is built per row:
+
+    {"columns": ["id", "date", "time"], "rows": [[1, "2030-01-01", "10:00"], ...]}
+
+Bodies of COMPRESS_MIN_BYTES or more are sent with `Content-Encoding: gzip` when
+the client's Accept-Encoding allows it. The body itself stays plain text: the
+Workers runtime compresses it on the way out when that header is set.
+"""
+import json
+from workers import Request, Response  # type: ignore
+from .router import args_of
+
+# Below this gzip saves less than the header and the CPU cost
+COMPRESS_MIN_BYTES = 1024
+
+FORMAT_QUERY = {
+    "format": {"type": "string", "enum": ["rows", "columns"], "default": "rows",
+               "description": "columns: {columns: [...], rows: [[...], ...]} instead of one object per row"},
+}
+
+
+def wants_columns(req: Request) -> bool:
+    return args_of(req).get("format") == "columns"
+
+
+def columns_body(columns: tuple[str, ...], rows: list[list], **extra) -> dict:
+    return {"columns": list(columns), "rows": rows, **extra}
+
+
+def accepts_gzip(req: Request) -> bool:
+    headers = getattr(req, "headers", None)
+    header = headers.get("Accept-Encoding") if headers is not None else None
+    if not header:
+        return False
+    weights = {}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
+
+def compress(req: Request, response: Response, size: int | None = None) -> Response:
+    """Ask for gzip when the client accepts it; `size` None is a streamed body, assumed large."""
+    if (size is None or size >= COMPRESS_MIN_BYTES) and accepts_gzip(req):
+        response.headers["Content-Encoding"] = "gzip"
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def respond_compact(req: Request, data, status: int = 200) -> Response:
+    """JSON response for list endpoints, compressed when large enough."""
+    body = json.dumps(data, separators=(",", ":"))
+    return compress(req, Response(body, status=status, headers={"Content-Type": "application/json"}), len(body))
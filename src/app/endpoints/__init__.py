@@ -1 +1,42 @@
-# package marker
\ No newline at end of file
+# src/app/endpoints/__init__.py
+"""
+Route manifest: which module registers which route.
+
+worker.py declares these up front and the router imports a module the first
+time one of its routes matches, so a cold isolate only imports the endpoints
+it actually serves. Keep it in sync with the @route decorators;
+bench/cold_start.py checks.
+"""
+ROUTES: dict[str, list[tuple[str, str]]] = {
+    "app.endpoints.meta": [
+        ("GET", "/health"),
+        ("GET", "/api/db/ping"),
+        ("GET", "/ready"),
+        ("GET", "/metrics"),
+    ],
+    "app.endpoints.users": [
+        ("OPTIONS", "/{any}"),
+        ("GET", "/api/users"),
+        ("GET", "/api/users/{telegram_id}"),
+        ("POST", "/api/users"),
+        ("PUT", "/api/users/{id}"),
+        ("DELETE", "/api/users/{telegram_id}"),
+        ("GET", "/api/bookings/by-user/{telegram_id}"),
+        ("POST", "/api/bookings"),
+        ("DELETE", "/api/bookings/{id}"),
+        ("GET", "/api/slots"),
+        ("GET", "/api/available-dates"),
+        ("POST", "/api/generate-slots"),
+        ("PUT", "/api/bookings/{id}/free"),
+        ("POST", "/api/bookings/bulk/free"),
+        ("POST", "/api/bookings/bulk/delete"),
+        ("POST", "/api/bookings/bulk/reassign"),
+    ],
+    "app.endpoints.batch": [
+        ("POST", "/api/batch"),
+    ],
+    "app.endpoints.transfer": [
+        ("GET", "/api/export/{kind}"),
+        ("POST", "/api/import/{kind}"),
+    ],
+}
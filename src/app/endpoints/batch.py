@@ -0,0 +1,123 @@
+import json
+from urllib.parse import urlsplit
+from workers import Request, Response  # type: ignore
+from app import admission
+from app.router import route, json_body, match, validate_operation, respond_json
+from app.validation import ValidationError
+from app.batching import Plan, PlanError, planner_for, run_plans
+
+MAX_BATCH_OPERATIONS = 50
+# Routes with these tags stream their body and are not run as batch operations
+STREAMING_TAGS = {"transfer"}
+
+BATCH_REQUEST_SCHEMA = {
+    "type": "object",
+    "required": ["operations"],
+    "properties": {
+        "operations": {
+            "type": "array",
+            "maxItems": MAX_BATCH_OPERATIONS,
+            "items": {
+                "type": "object",
+                "required": ["method", "path"],
+                "properties": {
+                    "method": {"type": "string", "example": "POST"},
+                    "path": {"type": "string", "example": "/api/bookings"},
+                    "body": {"type": "object"},
+                },
+            },
+        },
+    },
+}
+
+
+class _SubRequest:
+    """Just enough of a Request for a handler run on behalf of a batch operation."""
+
+    def __init__(self, parent: Request, method: str, path: str, body):
+        base = urlsplit(str(parent.url))
+        self.url = f"{base.scheme}://{base.netloc}{path}"
+        self.method = method
+        # conditional / idempotency headers of the outer request do not apply to its operations
+        self.headers = {}
+        self.scope = {k: v for k, v in parent.scope.items() if k == "env" or k == "timer"}
+        self._body = body
+
+    async def json(self):
+        if self._body is None:
+            raise ValueError("no body")
+        return self._body
+
+
+async def _run_sequentially(req: Request, ops: list[tuple[str, str, object]]) -> list[dict]:
+    results = []
+    for method, path, body in ops:
+        handler, params, meta = match(method, urlsplit(path).path)
+        if not handler:
+            results.append({"status": 404, "body": {"error": "Not found"}})
+            continue
+        if STREAMING_TAGS & set(meta.get("tags") or ()):
+            # NDJSON import/export read and write a body stream; a batch operation has neither
+            results.append({"status": 400, "body": {"error": f"{method} {path} cannot run in a batch"}})
+            continue
+        response = await handler(_SubRequest(req, method, path, body), **(params or {}))
+        if isinstance(response, Response):
+            text = await response.text()
+            try:
+                payload = json.loads(text) if text else None
+            except ValueError:
+                payload = text
+            results.append({"status": response.status, "body": payload})
+        else:
+            results.append({"status": 200, "body": response})
+    return results
+
+
+@route("POST", "/api/batch", summary="Run several operations in one request (one D1 batch when possible)",
+       request_body=BATCH_REQUEST_SCHEMA, tags=["batch"],
+       responses={"200": {"description": "Per-operation results, in order. atomic: true is one D1 "
+                                         "transaction: an SQL error rolls back every operation, but an "
+                                         "operation whose check fails (404, 409) only reports its status "
+                                         "and the others stay applied"},
+                  "400": {"description": "Malformed batch"}})
+async def run_batch(req: Request):
+    data = await json_body(req) or {}
+    raw_ops = data.get("operations")
+    if not isinstance(raw_ops, list) or not raw_ops:
+        return respond_json({"error": "operations must be a non-empty list"}, status=400)
+    if len(raw_ops) > MAX_BATCH_OPERATIONS:
+        return respond_json({"error": f"At most {MAX_BATCH_OPERATIONS} operations"}, status=400)
+
+    ops = []
+    for i, op in enumerate(raw_ops):
+        if not isinstance(op, dict) or not op.get("method") or not op.get("path"):
+            return respond_json({"error": f"operations[{i}] needs method and path"}, status=400)
+        if op["path"].rstrip("/") == "/api/batch":
+            return respond_json({"error": "Nested batches are not allowed"}, status=400)
+        ops.append((str(op["method"]).upper(), str(op["path"]), op.get("body")))
+    # admit() took one write token for the request; every further operation costs one more
+    admission.charge(req, len(ops) - 1)
+
+    # Все операции знают свой SQL — один D1 batch (одна транзакция).
+    # Ошибка SQL откатывает весь batch; операция, не прошедшая свою проверку (404/409),
+    # только возвращает свой статус — остальные операции остаются применёнными.
+    # Невалидная операция уходит в обычный обработчик, который и ответит 400
+    plans: list[Plan] = []
+    for method, path, body in ops:
+        parts = urlsplit(path)
+        _handler, params, meta = match(method, parts.path)
+        planner = planner_for(method, meta["path"]) if meta and not parts.query else None
+        if planner is None:
+            break
+        try:
+            typed = validate_operation(meta, params or {}, body)
+            plans.append(planner(typed, body if isinstance(body, dict) else {}))
+        except (ValidationError, PlanError):
+            break
+    if len(plans) == len(ops):
+        results = await run_plans(req, plans)
+        return respond_json({"atomic": True,
+                             "results": [{"status": st, "body": b} for st, b in results]})
+
+    # Иначе — по одной через обычные обработчики, без общей транзакции
+    return respond_json({"atomic": False, "results": await _run_sequentially(req, ops)})
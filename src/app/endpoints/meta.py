@@ -1,6 +1,31 @@
-from workers import Request  # type: ignore
+from workers import Request, Response  # type: ignore
 from ..router import route, respond_json
+from ..db import get_env, cache_stats
+from ..schema import ensure_schema
+from ..metrics import render_prometheus
 
-@route("GET", "/health", summary="Health check", tags=["meta"])
+@route("GET", "/health", summary="Health check", tags=["meta"], critical=True)
 async def health(_req: Request):
-    return {"ok": True}
\ No newline at end of file
+    return {"ok": True}
+
+@route("GET", "/api/db/ping", summary="DB schema state (cached per isolate)", tags=["meta"], critical=True)
+async def db_ping(req: Request):
+    state = await ensure_schema(get_env(req))
+    return respond_json({**state, "cache": cache_stats()}, status=200 if state["error"] is None else 503)
+
+@route("GET", "/ready", summary="Readiness probe", tags=["meta"], critical=True,
+       responses={"200": {"description": "Schema ready"}, "503": {"description": "Schema missing or D1 unavailable"}})
+async def ready(req: Request):
+    state = await ensure_schema(get_env(req))
+    return respond_json({"ready": state["ready"], "migration": state["migration"]},
+                        status=200 if state["ready"] else 503)
+
+@route("GET", "/metrics", summary="Per-isolate metrics (Prometheus text format)", tags=["meta"], critical=True)
+async def metrics(_req: Request):
+    lines = [render_prometheus(), "# TYPE d1_cache_events_total counter"]
+    stats = cache_stats()
+    for event in ("hits", "misses", "evictions", "invalidations"):
+        lines.append(f'd1_cache_events_total{{event="{event}"}} {stats[event]}')
+    lines.append("# TYPE d1_cache_entries gauge")
+    lines.append(f"d1_cache_entries {stats['entries']}")
+    return Response("\n".join(lines) + "\n", headers={"Content-Type": "text/plain; version=0.0.4"})
@@ -0,0 +1,183 @@
+# src/app/endpoints/transfer.py
+"""
+NDJSON export and import of users and bookings.
+
+Export walks the table by id in keyset pages and streams one JSON object per
+line, so memory stays at one page whatever the table size. Import reads the
+body line by line and upserts every `batch_size` valid lines with a single
+json_each statement (one D1 round trip); the report lists the failed lines.
+"""
+import json
+from workers import Request  # type: ignore
+from app import admission
+from app.router import route, respond_stream, body_lines, args_of, respond_json
+from app.db import d1_all, _to_py
+from app.encoding import compress
+from app.validation import ValidationError, compile_value
+from app.endpoints.users import USER_SCHEMA, BOOKING_SCHEMA, parse_slot
+
+EXPORT_PAGE_ROWS = 1000
+IMPORT_BATCH_DEFAULT = 500
+IMPORT_BATCH_MAX = 2000
+# The report keeps the first errors only; the counters are always complete
+MAX_IMPORT_ERRORS = 1000
+
+EXPORT_SQL = {
+    "users": "SELECT id, telegram_id, phone, name, role, created_at FROM users WHERE id > ? ORDER BY id LIMIT ?",
+    # telegram_id lets the lines be imported into a database where user ids differ
+    "bookings": "SELECT b.id, b.user_id, u.telegram_id, b.date, b.time, b.created_at "
+                "FROM bookings b LEFT JOIN users u ON u.id = b.user_id WHERE b.id > ? ORDER BY b.id LIMIT ?",
+}
+
+# A phone that belongs to another telegram_id is skipped (and reported) instead of failing the statement
+IMPORT_USERS_SQL = (
+    "INSERT INTO users (telegram_id, phone, name, role, created_at) "
+    "SELECT json_extract(value, '$.telegram_id'), json_extract(value, '$.phone'), json_extract(value, '$.name'), "
+    "json_extract(value, '$.role'), COALESCE(json_extract(value, '$.created_at'), CURRENT_TIMESTAMP) "
+    "FROM json_each(?) WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.phone = json_extract(value, '$.phone') "
+    "AND u.telegram_id != json_extract(value, '$.telegram_id')) "
+    "ON CONFLICT(telegram_id) DO UPDATE SET phone = excluded.phone, name = excluded.name, role = excluded.role "
+    "RETURNING telegram_id"
+)
+# Owner by telegram_id when given, else by user_id; lines without an existing owner are skipped
+IMPORT_BOOKINGS_SQL = (
+    "INSERT INTO bookings (user_id, date, time, slot_start, created_at) "
+    "SELECT u.id, json_extract(j.value, '$.date'), json_extract(j.value, '$.time'), "
+    "json_extract(j.value, '$.slot_start'), COALESCE(json_extract(j.value, '$.created_at'), CURRENT_TIMESTAMP) "
+    "FROM json_each(?) j JOIN users u ON u.id = COALESCE("
+    "(SELECT id FROM users WHERE telegram_id = json_extract(j.value, '$.telegram_id')), "
+    "json_extract(j.value, '$.user_id')) "
+    "WHERE true ON CONFLICT(date, time) DO UPDATE SET user_id = excluded.user_id "
+    "RETURNING date, time"
+)
+
+KIND_PARAM = {"kind": {"type": "string", "enum": ["users", "bookings"]}}
+
+_check_user = compile_value(USER_SCHEMA, "line")
+_check_booking = compile_value(BOOKING_SCHEMA, "line")
+
+
+async def _export_lines(req: Request, kind: str):
+    after_id = 0
+    while True:
+        rows = await d1_all(req, EXPORT_SQL[kind], after_id, EXPORT_PAGE_ROWS)
+        page = [row.to_py() for row in rows]
+        if not page:
+            return
+        yield "".join(json.dumps(row) + "\n" for row in page)
+        if len(page) < EXPORT_PAGE_ROWS:
+            return
+        after_id = page[-1]["id"]
+
+
+@route("GET", "/api/export/{kind}", summary="Stream users or bookings as NDJSON, in id order",
+       params=KIND_PARAM, tags=["transfer"])
+async def export_ndjson(req: Request, kind: str):
+    return compress(req, await respond_stream(_export_lines(req, kind), content_type="application/x-ndjson"))
+
+
+def _user_row(data: dict) -> tuple[tuple, dict]:
+    _check_user(data)
+    row = {k: data[k] for k in ("telegram_id", "phone", "name", "role")}
+    if data.get("created_at"):
+        row["created_at"] = data["created_at"]
+    return (data["telegram_id"],), row
+
+
+def _booking_row(data: dict) -> tuple[tuple, dict]:
+    _check_booking(data)
+    if data.get("telegram_id") is None and data.get("user_id") is None:
+        raise ValidationError("Missing user_id or telegram_id")
+    row = {k: data[k] for k in ("user_id", "telegram_id", "date", "time", "created_at") if data.get(k) is not None}
+    row["slot_start"] = parse_slot(data["date"], data["time"])
+    return (data["date"], data["time"]), row
+
+
+IMPORTERS = {
+    # kind: (line -> (key, row), statement, returned row -> key, error for a skipped line)
+    "users": (_user_row, IMPORT_USERS_SQL, lambda r: (r["telegram_id"],),
+              "phone already belongs to another user"),
+    "bookings": (_booking_row, IMPORT_BOOKINGS_SQL, lambda r: (r["date"], r["time"]),
+                 "user not found"),
+}
+
+
+class _Report:
+    __slots__ = ("lines", "statements", "imported", "failed", "errors")
+
+    def __init__(self):
+        self.lines = 0
+        self.statements = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors: list[dict] = []
+
+    def error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+
+async def _flush(req: Request, kind: str, chunk: list[tuple[int, tuple, dict]], report: _Report):
+    _parse, sql, key_of, skipped = IMPORTERS[kind]
+    report.statements += 1
+    try:
+        rows = await d1_all(req, sql, json.dumps([row for _line, _key, row in chunk]))
+    except Exception as e:
+        for line, _key, _row in chunk:
+            report.error(line, f"batch failed: {e}")
+        return
+    written = {key_of(_to_py(r)) for r in rows}
+    for line, key, _row in chunk:
+        if key in written:
+            report.imported += 1
+        else:
+            report.error(line, skipped)
+
+
+@route("POST", "/api/import/{kind}", summary="Upsert users or bookings from an NDJSON body",
+       params=KIND_PARAM, tags=["transfer"],
+       query={"batch_size": {"type": "integer", "minimum": 1, "maximum": IMPORT_BATCH_MAX,
+                             "default": IMPORT_BATCH_DEFAULT, "description": "lines per D1 statement"}},
+       responses={"200": {"description": "Counts and the first failed lines"}})
+async def import_ndjson(req: Request, kind: str):
+    parse = IMPORTERS[kind][0]
+    batch_size = args_of(req)["batch_size"]
+    report = _Report()
+    chunk: list[tuple[int, tuple, dict]] = []
+    keys: set[tuple] = set()  # unique keys in the pending chunk
+    phones: set[str] = set()  # users: a phone twice in one statement would fail all of it
+
+    async for text in body_lines(req):
+        report.lines += 1
+        if not text.strip():
+            continue
+        try:
+            data = json.loads(text)
+            if not isinstance(data, dict):
+                raise ValidationError("line must be a JSON object")
+            key, row = parse(data)
+        except (ValueError, ValidationError) as e:
+            report.error(report.lines, str(e))
+            continue
+        phone = row.get("phone") if kind == "users" else None
+        if key in keys or (phone is not None and phone in phones):
+            # Повтор внутри одной пачки: сначала записываем предыдущие строки
+            await _flush(req, kind, chunk, report)
+            chunk, keys, phones = [], set(), set()
+        chunk.append((report.lines, key, row))
+        keys.add(key)
+        if phone is not None:
+            phones.add(phone)
+        if len(chunk) >= batch_size:
+            await _flush(req, kind, chunk, report)
+            chunk, keys, phones = [], set(), set()
+    if chunk:
+        await _flush(req, kind, chunk, report)
+    # One write token per upsert statement; admit() already took the first
+    admission.charge(req, report.statements - 1)
+
+    return respond_json({
+        "kind": kind, "lines": report.lines, "imported": report.imported, "failed": report.failed,
+        "errors": sorted(report.errors, key=lambda e: e["line"]), "errors_truncated": report.failed > len(report.errors),
+    })
@@ -1,28 +1,38 @@
 import json
 from workers import Request, Response  # type: ignore
-from urllib.parse import urlsplit, parse_qs
-from app.router import route, json_body
-from app.db import d1_run, d1_first, d1_all
-from typing import Callable, Any
-from datetime import datetime, timedelta
-
-def respond_json(data, status=200):
-    return Response(json.dumps(data), status=status, headers={
-        "Content-Type": "application/json",
-        "Access-Control-Allow-Origin": "*",
-        "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type"
-    })
-
-def get_query_param(req: Request, name: str, required: bool = False, cast: Callable = str) -> Any:
-    query = parse_qs(urlsplit(str(req.url)).query)
-    value = query.get(name, [None])[0]
-    if required and value is None:
-        raise ValueError(f"Missing required query parameter: {name}")
+from app.router import route, json_body, respond_stream, args_of, respond_json
+from app.http_cache import conditional
+from app.batching import Plan, PlanError, batch_plan, run_plan
+from app.idempotency import idempotent
+from app.db import d1_run, d1_first, d1_all, d1_raw, d1_changes, d1_first_cached
+from app.encoding import FORMAT_QUERY, wants_columns, columns_body, respond_compact, compress
+from datetime import datetime, timedelta, timezone
+import re
+
+_SLOT_RE = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}$")
+
+def parse_slot(date: str, time: str) -> int:
+    """
+    `YYYY-MM-DD` + `HH:MM` (UTC) -> bookings.slot_start, minutes since the epoch.
+    Anything else (including `9:00` or `2030-1-2`) raises ValueError.
+    """
+    # fromisoformat is several times cheaper than strptime (import parses it per line);
+    # the regex keeps the accepted format as strict as before
+    text = f"{date} {time}"
+    if not _SLOT_RE.match(text):
+        raise ValueError("Slot must be date YYYY-MM-DD and time HH:MM")
     try:
-        return cast(value) if value is not None else None
-    except Exception:
-        raise ValueError(f"Invalid value for query parameter '{name}': {value}")
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError("Slot must be date YYYY-MM-DD and time HH:MM")
+    return int(parsed.replace(tzinfo=timezone.utc).timestamp()) // 60
+
+def day_start(day: str) -> int:
+    return parse_slot(day, "00:00")
+
+async def get_admin_id(req: Request) -> int | None:
+    admin = await d1_first_cached(req, "SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1", ttl=300)
+    return admin["id"] if admin else None
 
 @route("OPTIONS", "/{any}")
 async def options_all(req: Request, any: str):
@@ -34,45 +44,121 @@ async def options_all(req: Request, any: str):
 
 # ---------------- USERS ----------------
 
-@route("GET", "/api/users")
+USERS_PAGE_DEFAULT = 50
+USERS_PAGE_MAX = 200
+STREAM_CHUNK_ROWS = 50
+
+USER_COLUMNS = ("id", "telegram_id", "phone", "name", "role", "created_at")
+USERS_SELECT = f"SELECT {', '.join(USER_COLUMNS)} FROM users"
+
+def _users_page_chunks(items: list, next_cursor):
+    yield '{"items":['
+    for i in range(0, len(items), STREAM_CHUNK_ROWS):
+        part = ",".join(json.dumps(row.to_py()) for row in items[i:i + STREAM_CHUNK_ROWS])
+        yield ("," if i else "") + part
+    yield '],"next_cursor":' + json.dumps(next_cursor) + "}"
+
+@route("GET", "/api/users", summary="List users (keyset pages: ?limit=&after_id=) or find by telegram_id/phone",
+       query={"telegram_id": {"type": "integer"}, "phone": {"type": "string"},
+              "limit": {"type": "integer", "minimum": 1, "default": USERS_PAGE_DEFAULT,
+                        "description": f"Clamped to {USERS_PAGE_MAX}"},
+              "after_id": {"type": "integer", "description": "next_cursor of the previous page"},
+              **FORMAT_QUERY})
 async def list_or_query_users(req: Request):
-    telegram_id = get_query_param(req, "telegram_id")
-    phone = get_query_param(req, "phone")
-    if telegram_id:
-        rows = await d1_all(req, "SELECT id, telegram_id, phone, name, role, created_at FROM users WHERE telegram_id = ?", telegram_id)
-    elif phone:
-        rows = await d1_all(req, "SELECT id, telegram_id, phone, name, role, created_at FROM users WHERE phone = ?", phone)
+    args = args_of(req)
+    telegram_id = args.get("telegram_id")
+    phone = args.get("phone")
+    columns = wants_columns(req)
+    fetch = d1_raw if columns else d1_all
+    if telegram_id is not None or phone:
+        if telegram_id is not None:
+            rows = await fetch(req, f"{USERS_SELECT} WHERE telegram_id = ?", telegram_id)
+        else:
+            rows = await fetch(req, f"{USERS_SELECT} WHERE phone = ?", phone)
+        if columns:
+            return respond_compact(req, columns_body(USER_COLUMNS, rows))
+        return respond_json([row.to_py() for row in rows])
+
+    limit = min(args["limit"], USERS_PAGE_MAX)
+    after_id = args.get("after_id")
+
+    # Keyset: newest first, the cursor is the last id of the previous page.
+    # One extra row tells whether there is a next page.
+    if after_id is not None:
+        rows = await fetch(req, f"{USERS_SELECT} WHERE id < ? ORDER BY id DESC LIMIT ?", after_id, limit + 1)
     else:
-        rows = await d1_all(req, "SELECT id, telegram_id, phone, name, role, created_at FROM users ORDER BY id DESC")
-    return respond_json([row.to_py() for row in rows])
+        rows = await fetch(req, f"{USERS_SELECT} ORDER BY id DESC LIMIT ?", limit + 1)
+    items = list(rows)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = items[-1][0] if columns else items[-1].to_py()["id"]
+    if columns:
+        return respond_compact(req, columns_body(USER_COLUMNS, items, next_cursor=next_cursor))
+    return compress(req, await respond_stream(_users_page_chunks(items, next_cursor)))
+
+@batch_plan("GET", "/api/users/{telegram_id}")
+def plan_get_user(params: dict, _body: dict) -> Plan:
+    def finish(results):
+        rows = results[0][0]
+        return (200, rows[0]) if rows else (404, {"error": "Not found"})
+    return Plan([("SELECT id, telegram_id, phone, name, role, created_at FROM users WHERE telegram_id = ?",
+                  (params["telegram_id"],))], finish)
 
 @route("GET", "/api/users/{telegram_id}")
+@conditional("users")
 async def get_user(req: Request, telegram_id: int):
-    row = await d1_first(req, "SELECT id, telegram_id, phone, name, role, created_at FROM users WHERE telegram_id = ?", telegram_id)
-    if not row:
-        return respond_json({"error": "Not found"}, status=404)
-    return respond_json(row.to_py())
+    status, body = await run_plan(req, plan_get_user({"telegram_id": telegram_id}, {}))
+    return respond_json(body, status=status)
 
-@route("POST", "/api/users")
-async def create_user(req: Request):
-    data = await json_body(req) or {}
+@batch_plan("POST", "/api/users")
+def plan_create_user(_params: dict, data: dict) -> Plan:
     telegram_id = data.get("telegram_id")
     phone = data.get("phone")
     name = data.get("name")
     role = data.get("role")
     if telegram_id is None or phone is None or name is None or role is None:
-        return respond_json({"error": "All fields are required"}, status=400)
-
-    existing = await d1_first(req, "SELECT id, telegram_id, phone, name, role, created_at FROM users WHERE telegram_id = ? OR phone = ?", telegram_id, phone)
-    if existing:
-        return respond_json(existing.to_py(), status=200)
-
-    await d1_run(req, "INSERT INTO users (telegram_id, phone, name, role) VALUES (?, ?, ?, ?)", telegram_id, phone, name, role)
-    row = await d1_first(req, "SELECT id, telegram_id, phone, name, role, created_at FROM users WHERE telegram_id = ?", telegram_id)
-    return respond_json(row.to_py(), status=201)
-
-@route("PUT", "/api/users/{id}")
-async def update_user(req: Request, id: str):
+        raise PlanError("All fields are required")
+
+    # Существующий пользователь (по telegram_id или телефону) возвращается как есть — 200
+    def finish(results):
+        (_rows, inserted), (rows, _changes) = results
+        return (201 if inserted else 200), rows[0]
+    return Plan([
+        ("INSERT INTO users (telegram_id, phone, name, role) VALUES (?, ?, ?, ?) ON CONFLICT DO NOTHING",
+         (telegram_id, phone, name, role)),
+        ("SELECT id, telegram_id, phone, name, role, created_at FROM users "
+         "WHERE telegram_id = ? OR phone = ? ORDER BY telegram_id = ? DESC LIMIT 1",
+         (telegram_id, phone, telegram_id)),
+    ], finish)
+
+USER_SCHEMA = {
+    "type": "object",
+    "required": ["telegram_id", "phone", "name", "role"],
+    "properties": {
+        "telegram_id": {"type": "integer"},
+        "phone": {"type": "string", "minLength": 1},
+        "name": {"type": "string", "minLength": 1},
+        "role": {"type": "string", "example": "user"},
+    },
+}
+USER_UPDATE_SCHEMA = {"type": "object", "properties": {k: v for k, v in USER_SCHEMA["properties"].items()
+                                                        if k != "telegram_id"}}
+
+@route("POST", "/api/users", summary="Register a user (an existing one is returned with 200)",
+       request_body=USER_SCHEMA)
+@idempotent
+async def create_user(req: Request):
+    data = await json_body(req) or {}
+    try:
+        plan = plan_create_user({}, data)
+    except PlanError as e:
+        return respond_json({"error": str(e)}, status=400)
+    status, body = await run_plan(req, plan)
+    return respond_json(body, status=status)
+
+@route("PUT", "/api/users/{id}", request_body=USER_UPDATE_SCHEMA)
+async def update_user(req: Request, id: int):
     data = await json_body(req) or {}
     sets = []; params = []
     existing = await d1_first(req, "SELECT id FROM users WHERE id = ?", id)
@@ -94,170 +180,410 @@ async def update_user(req: Request, id: str):
     row = await d1_first(req, "SELECT id, telegram_id, phone, name, role, created_at FROM users WHERE id = ?", id)
     return respond_json(row.to_py(), status=200)
 
+# Каскад одним D1 batch (одна транзакция): записи пользователя и он сам удаляются вместе
+@batch_plan("DELETE", "/api/users/{telegram_id}")
+def plan_delete_user(params: dict, _body: dict) -> Plan:
+    telegram_id = params["telegram_id"]
+
+    def finish(results):
+        (_rows, bookings_deleted), (rows, _changes) = results
+        if not rows:
+            return 404, {"error": "User not found"}
+        return 200, {"ok": True, "bookings_deleted": bookings_deleted}
+    return Plan([
+        ("DELETE FROM bookings WHERE user_id = (SELECT id FROM users WHERE telegram_id = ?)", (telegram_id,)),
+        ("DELETE FROM users WHERE telegram_id = ? RETURNING id", (telegram_id,)),
+    ], finish)
+
 @route("DELETE", "/api/users/{telegram_id}")
 async def delete_user(req: Request, telegram_id: int):
-    user = await d1_first(req, "SELECT id FROM users WHERE telegram_id = ?", telegram_id)
-    if not user:
-        return respond_json({"error": "User not found"}, status=404)
-    user_id = user.to_py()["id"]
-    await d1_run(req, "DELETE FROM bookings WHERE user_id = ?", user_id)
-    await d1_run(req, "DELETE FROM users WHERE id = ?", user_id)
-    return respond_json({"ok": True}, status=200)
+    status, body = await run_plan(req, plan_delete_user({"telegram_id": telegram_id}, {}))
+    return respond_json(body, status=status)
 
 # ---------------- BOOKINGS ----------------
 
-@route("GET", "/api/bookings/by-user/{telegram_id}")
+# Один запрос; неизвестный пользователь — пустой список (регистрация только через POST /api/users).
+# Порядок отдаёт idx_bookings_user_slot_start
+BOOKING_COLUMNS = ("id", "date", "time")
+BOOKINGS_BY_TELEGRAM_SQL = (
+    "SELECT b.id, b.date, b.time FROM users u JOIN bookings b ON b.user_id = u.id "
+    "WHERE u.telegram_id = ? ORDER BY b.slot_start DESC"
+)
+
+@batch_plan("GET", "/api/bookings/by-user/{telegram_id}")
+def plan_bookings_by_telegram(params: dict, _body: dict) -> Plan:
+    return Plan([(BOOKINGS_BY_TELEGRAM_SQL, (params["telegram_id"],))],
+                lambda results: (200, results[0][0]))
+
+@route("GET", "/api/bookings/by-user/{telegram_id}", query=FORMAT_QUERY)
+@conditional("users", "bookings")
 async def get_bookings_by_telegram(req: Request, telegram_id: int):
-    # Проверяем, есть ли пользователь
-    user = await d1_first(req, "SELECT id FROM users WHERE telegram_id = ?", telegram_id)
-    if not user:
-        # Если нет — создаём нового пользователя с дефолтными данными
-        await d1_run(
-            req,
-            "INSERT INTO users (telegram_id, phone, name, role) VALUES (?, ?, ?, ?)",
-            telegram_id,
-            "00000000",   # дефолтный телефон
-            "Без имени",  # дефолтное имя
-            "user"        # дефолтная роль
-        )
-        user = await d1_first(req, "SELECT id FROM users WHERE telegram_id = ?", telegram_id)
-
-    user_id = user.to_py()["id"]
-
-    # Загружаем записи пользователя
-    rows = await d1_all(
-        req,
-        "SELECT id, date, time FROM bookings WHERE user_id = ? ORDER BY date DESC, time DESC",
-        user_id
+    if wants_columns(req):
+        rows = await d1_raw(req, BOOKINGS_BY_TELEGRAM_SQL, telegram_id)
+        return respond_compact(req, columns_body(BOOKING_COLUMNS, rows))
+    rows = await d1_all(req, BOOKINGS_BY_TELEGRAM_SQL, telegram_id)
+    return respond_compact(req, [row.to_py() for row in rows])
+
+
+# Захват слота одним выражением: слот свободен, пока принадлежит админу.
+# Если два запроса пришли одновременно, строку обновит только один.
+# Пользователь задаётся по users.id или по telegram_id (удобно в /api/batch сразу после создания).
+def _claim_slot_sql(user_key: str) -> str:
+    return (
+        f"UPDATE bookings SET user_id = (SELECT id FROM users WHERE {user_key} = ?) "
+        "WHERE slot_start = ? "
+        "AND user_id = (SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1) "
+        f"AND EXISTS (SELECT 1 FROM users WHERE {user_key} = ?) "
+        "RETURNING id, user_id, date, time"
     )
 
-    return respond_json([row.to_py() for row in rows])
+ADMIN_ID_SQL = "(SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1)"
 
+CLAIM_SLOT_SQL = _claim_slot_sql("id")
+CLAIM_SLOT_BY_TELEGRAM_SQL = _claim_slot_sql("telegram_id")
 
-
-@route("POST", "/api/bookings")
-async def create_booking(req: Request):
-    data = await json_body(req) or {}
-    user_id = data.get("user_id")
+@batch_plan("POST", "/api/bookings")
+def plan_create_booking(_params: dict, data: dict) -> Plan:
     date = data.get("date")
     time = data.get("time")
+    if data.get("user_id") is not None:
+        sql, key, who = CLAIM_SLOT_SQL, "id", data["user_id"]
+    elif data.get("telegram_id") is not None:
+        sql, key, who = CLAIM_SLOT_BY_TELEGRAM_SQL, "telegram_id", data["telegram_id"]
+    else:
+        who = None
+    if who is None or date is None or time is None:
+        raise PlanError("All fields are required")
+    try:
+        slot_start = parse_slot(date, time)
+    except ValueError as e:
+        raise PlanError(str(e))
+
+    # Причину отказа выясняет второе выражение того же batch — без лишних запросов
+    def finish(results):
+        (claimed, _changes), (state, _) = results
+        if claimed:
+            return 200, claimed[0]
+        state = state[0]
+        if state["user_id"] is None:
+            return 404, {"error": "User not found"}
+        if state["admin_id"] is None:
+            return 400, {"error": "No admin found"}
+        if state["slot_id"] is None:
+            return 404, {"error": "Slot not available"}
+        return 409, {"error": "Slot already taken"}
+    return Plan([
+        (sql, (who, slot_start, who)),
+        (f"SELECT (SELECT id FROM users WHERE {key} = ?) AS user_id, {ADMIN_ID_SQL} AS admin_id, "
+         "(SELECT id FROM bookings WHERE slot_start = ?) AS slot_id", (who, slot_start)),
+    ], finish)
+
+BOOKING_SCHEMA = {
+    "type": "object",
+    "required": ["date", "time"],
+    "properties": {
+        "user_id": {"type": "integer"},
+        "telegram_id": {"type": "integer", "description": "instead of user_id"},
+        "date": {"type": "string", "format": "date"},
+        "time": {"type": "string", "pattern": r"^\d{2}:\d{2}$", "example": "10:00"},
+    },
+}
+
+@route("POST", "/api/bookings", summary="Claim a free slot (user_id or telegram_id)",
+       request_body=BOOKING_SCHEMA,
+       responses={"200": {"description": "Booked"}, "404": {"description": "User or slot not found"},
+                  "409": {"description": "Slot already taken"}})
+@idempotent
+async def create_booking(req: Request):
+    data = await json_body(req) or {}
+    try:
+        plan = plan_create_booking({}, data)
+    except PlanError as e:
+        return respond_json({"error": str(e)}, status=400)
 
-    if user_id is None or date is None or time is None:
-        return respond_json({"error": "All fields are required"}, status=400)
-
-    # Проверка существования пользователя
-    user = await d1_first(req, "SELECT id FROM users WHERE id = ?", user_id)
-    if not user:
-        return respond_json({"error": "User not found"}, status=404)
-
-    # Ищем свободный слот (у админа)
-    admin = await d1_first(req, "SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1")
-    if not admin:
-        return respond_json({"error": "No admin found"}, status=400)
-    admin_id = admin.to_py()["id"] if hasattr(admin, "to_py") else admin["id"]
-
-    slot = await d1_first(
-        req,
-        "SELECT id FROM bookings WHERE user_id = ? AND date = ? AND time = ?",
-        admin_id, date, time
-    )
-    if not slot:
-        return respond_json({"error": "Slot not available"}, status=404)
-
-    # Обновляем слот: назначаем его пользователю
-    await d1_run(req, "UPDATE bookings SET user_id = ? WHERE id = ?", user_id, slot.to_py()["id"])
+    status, body = await run_plan(req, plan)
+    return respond_json(body, status=status)
 
-    # Возвращаем обновлённую запись
-    row = await d1_first(req, "SELECT id, user_id, date, time FROM bookings WHERE id = ?", slot.to_py()["id"])
-    return respond_json(row.to_py(), status=200)
 
+@batch_plan("DELETE", "/api/bookings/{id}")
+def plan_delete_booking(params: dict, _body: dict) -> Plan:
+    def finish(results):
+        return (200, {"ok": True}) if results[0][0] else (404, {"error": "Booking not found"})
+    return Plan([("DELETE FROM bookings WHERE id = ? RETURNING id", (params["id"],))], finish)
 
 @route("DELETE", "/api/bookings/{id}")
 async def delete_booking(req: Request, id: int):
-    existing = await d1_first(req, "SELECT id FROM bookings WHERE id = ?", id)
-    if not existing:
-        return respond_json({"error": "Booking not found"}, status=404)
-    await d1_run(req, "DELETE FROM bookings WHERE id = ?", id)
-    return respond_json({"ok": True}, status=200)
+    status, body = await run_plan(req, plan_delete_booking({"id": id}, {}))
+    return respond_json(body, status=status)
+
+# ---------------- SLOTS ----------------
+
+MAX_SLOT_RANGE_DAYS = 62
+
+DATE_PARAM = {"type": "string", "format": "date"}
+
+@route("GET", "/api/slots", summary="Free slots: ?date=, ?from=&to= (YYYY-MM-DD) or ?days=N from today (UTC)",
+       query={"date": DATE_PARAM, "from": DATE_PARAM, "to": DATE_PARAM,
+              "days": {"type": "integer", "minimum": 1, "maximum": MAX_SLOT_RANGE_DAYS}, **FORMAT_QUERY})
+@conditional("users", "bookings")
+async def list_free_slots(req: Request):
+    args = args_of(req)
+    date = args.get("date")
+    if args.get("days") is not None and not date and not args.get("from"):
+        # «Ближайшие N дней»
+        today = datetime.now(timezone.utc).date()
+        date_from, date_to = today.isoformat(), (today + timedelta(days=args["days"] - 1)).isoformat()
+    else:
+        date_from = args.get("from") or date
+        date_to = args.get("to") or date_from
+    if not date_from:
+        return respond_json({"error": "Missing date (use date, from/to or days)"}, status=400)
+    first = day_start(date_from)
+    last = day_start(date_to)
+    if last < first or (last - first) // 1440 >= MAX_SLOT_RANGE_DAYS:
+        return respond_json({"error": f"Range must be 1..{MAX_SLOT_RANGE_DAYS} days"}, status=400)
+
+    # Свободный слот = запись админа; диапазон по idx_bookings_user_slot_start
+    admin_id = await get_admin_id(req)
+    columns = wants_columns(req)
+    if admin_id is None:
+        return respond_json(columns_body(BOOKING_COLUMNS, []) if columns else {"slots": []})
+    rows = await (d1_raw if columns else d1_all)(
+        req,
+        "SELECT id, date, time FROM bookings WHERE user_id = ? AND slot_start >= ? AND slot_start < ? "
+        "ORDER BY slot_start",
+        admin_id, first, last + 1440
+    )
+    if columns:
+        return respond_compact(req, columns_body(BOOKING_COLUMNS, rows))
+    return respond_compact(req, {"slots": [row.to_py() for row in rows]})
 
 # ---------------- DATES ----------------
 
-@route("GET", "/api/available-dates")
+@route("GET", "/api/available-dates", summary="Dates that still have free slots: ?from=&to= (YYYY-MM-DD, optional)",
+       query={"from": DATE_PARAM, "to": DATE_PARAM, **FORMAT_QUERY})
+@conditional("users", "bookings")
 async def get_available_dates(req: Request):
-    # Возвращаем уникальные даты, где есть хоть одна запись
-    rows = await d1_all(req, "SELECT DISTINCT date FROM bookings ORDER BY date ASC")
-    # D1 возвращает объекты с .to_py(), но на всякий случай поддержим словари
-    def get_date(row):
-        return row.to_py()["date"] if hasattr(row, "to_py") else row["date"]
-    dates = [get_date(row) for row in rows]
-    return respond_json({"dates": dates})
-
-
-@route("POST", "/api/generate-slots")
+    # Счётчики slot_days ведут триггеры (migrations/0012); здесь — диапазон по первичному ключу
+    args = args_of(req)
+    rows = await d1_raw(
+        req,
+        "SELECT date FROM slot_days WHERE date >= ? AND date <= ? AND free > 0 ORDER BY date",
+        args.get("from") or "0000-00-00", args.get("to") or "9999-99-99"
+    )
+    if wants_columns(req):
+        return respond_compact(req, columns_body(("date",), rows))
+    return respond_compact(req, {"dates": [row[0] for row in rows]})
+
+
+DEFAULT_SLOT_TIMES = ["10:00", "11:00", "12:00", "14:00", "15:00", "16:00"]
+MAX_GENERATE_DAYS = 366
+
+def _slot_plan(body: dict) -> tuple[list[tuple[str, str, int]], dict]:
+    """
+    Expand a generate-slots request into (date, time, slot_start) triples.
+
+    Days: `date`, or `from`/`to` (inclusive), or `days_ahead` starting today (UTC).
+    Filters: `weekdays` (ISO 1=Mon..7=Sun), `skip_weekends`.
+    Times: `times` template, overridden per weekday by `times_by_weekday` {"6": [...]}.
+    """
+    if body.get("date"):
+        first = last = datetime.strptime(body["date"], "%Y-%m-%d").date()
+    elif body.get("from"):
+        first = datetime.strptime(body["from"], "%Y-%m-%d").date()
+        last = datetime.strptime(body.get("to") or body["from"], "%Y-%m-%d").date()
+    elif body.get("days_ahead"):
+        first = datetime.now(timezone.utc).date()
+        last = first + timedelta(days=int(body["days_ahead"]) - 1)
+    else:
+        raise ValueError("Missing date (use date, from/to or days_ahead)")
+    if last < first:
+        raise ValueError("'to' is before 'from'")
+    days = (last - first).days + 1
+    if days > MAX_GENERATE_DAYS:
+        raise ValueError(f"Range too long: {days} days (max {MAX_GENERATE_DAYS})")
+
+    weekdays = set(int(d) for d in body.get("weekdays") or range(1, 8))
+    if body.get("skip_weekends"):
+        weekdays -= {6, 7}
+    times = body.get("times") or DEFAULT_SLOT_TIMES
+    times_by_weekday = {int(k): v for k, v in (body.get("times_by_weekday") or {}).items()}
+    for t in [*times, *(t for ts in times_by_weekday.values() for t in ts)]:
+        parse_slot("2000-01-01", t)
+
+    slots = []
+    skipped_days = 0
+    for i in range(days):
+        day = first + timedelta(days=i)
+        if day.isoweekday() not in weekdays:
+            skipped_days += 1
+            continue
+        d = day.isoformat()
+        slots.extend((d, t, parse_slot(d, t)) for t in times_by_weekday.get(day.isoweekday(), times))
+    return slots, {"from": first.isoformat(), "to": last.isoformat(), "days_considered": days,
+                   "skipped_days": skipped_days, "times_used": times}
+
+SLOT_TIME = {"type": "string", "pattern": r"^\d{2}:\d{2}$", "example": "10:00"}
+GENERATE_SLOTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "date": DATE_PARAM,
+        "from": DATE_PARAM,
+        "to": DATE_PARAM,
+        "days_ahead": {"type": "integer", "minimum": 1, "maximum": MAX_GENERATE_DAYS},
+        "weekdays": {"type": "array", "items": {"type": "integer", "minimum": 1, "maximum": 7}},
+        "skip_weekends": {"type": "boolean"},
+        "times": {"type": "array", "items": SLOT_TIME},
+        "times_by_weekday": {"type": "object", "example": {"6": ["10:00", "11:00"]}},
+    },
+}
+
+@route("POST", "/api/generate-slots", summary="Generate free slots for a date or a date range",
+       request_body=GENERATE_SLOTS_SCHEMA)
 async def generate_slots(req: Request):
-    body = json_body(req) or {}
-    date = body.get("date")
-    times = body.get("times") or ["10:00", "11:00", "12:00", "14:00", "15:00", "16:00"]
-
-    if not date:
-        return respond_json({"error": "Missing date"}, status=400)
+    body = await json_body(req) or {}
+    try:
+        slots, info = _slot_plan(body)
+    except (ValueError, TypeError) as e:
+        return respond_json({"error": str(e)}, status=400)
 
     # Нужен админ
-    admin = await d1_first(req, "SELECT id FROM users WHERE role = 'admin' LIMIT 1")
-    if not admin:
+    admin_id = await get_admin_id(req)
+    if admin_id is None:
         return respond_json({"error": "Нет администратора"}, status=400)
 
-    user_id = admin["id"]
-
+    # Все слоты одним запросом; существующие отсекает idx_unique_booking_slot
     generated = 0
-    skipped_existing = 0
-
-    for time in times:
-        exists = await d1_first(
-            req,
-            "SELECT id FROM bookings WHERE date = ? AND time = ?",
-            date, time
-        )
-        if exists:
-            skipped_existing += 1
-            continue
-
-        await d1_run(
+    if slots:
+        res = await d1_run(
             req,
-            "INSERT INTO bookings (user_id, date, time) VALUES (?, ?, ?)",
-            user_id, date, time
+            "INSERT OR IGNORE INTO bookings (user_id, date, time, slot_start) "
+            "SELECT ?, json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]') "
+            "FROM json_each(?)",
+            admin_id, json.dumps(slots)
         )
-        generated += 1
+        generated = d1_changes(res)
 
     return respond_json({
         "ok": True,
         "generated": generated,
-        "skipped_existing_slots": skipped_existing,
-        "date": date,
-        "times_used": times
+        "skipped_existing_slots": len(slots) - generated,
+        **({"date": body["date"]} if body.get("date") else {}),
+        **info,
     })
 
-
-    return respond_json({
-        "ok": True,
-        "generated": generated,
-        "skipped_weekend_days": skipped_weekend,
-        "skipped_existing_slots": skipped_existing,
-        "days_considered": days_ahead,
-        "times_used": times
-    }, status=200)
+@batch_plan("PUT", "/api/bookings/{id}/free")
+def plan_free_booking(params: dict, _body: dict) -> Plan:
+    # Освобождённый слот снова принадлежит админу; нет админа — строка не меняется
+    def finish(results):
+        (rows, _changes), (admin, _) = results
+        if rows:
+            return 200, rows[0]
+        if admin[0]["admin_id"] is None:
+            return 400, {"error": "No admin found"}
+        return 404, {"error": "Booking not found"}
+    return Plan([(f"UPDATE bookings SET user_id = {ADMIN_ID_SQL} WHERE id = ? AND EXISTS {ADMIN_ID_SQL} "
+                  "RETURNING id, user_id, date, time", (params["id"],)),
+                 (f"SELECT {ADMIN_ID_SQL} AS admin_id", ())], finish)
 
 @route("PUT", "/api/bookings/{id}/free")
 async def free_booking(req: Request, id: int):
-    admin = await d1_first(req, "SELECT id FROM users WHERE role = 'admin' ORDER BY id LIMIT 1")
-    if not admin:
-        return respond_json({"error": "No admin found"}, status=400)
-    admin_id = admin.to_py()["id"]
-
-    existing = await d1_first(req, "SELECT id FROM bookings WHERE id = ?", id)
-    if not existing:
-        return respond_json({"error": "Booking not found"}, status=404)
-
-    await d1_run(req, "UPDATE bookings SET user_id = ? WHERE id = ?", admin_id, id)
-    row = await d1_first(req, "SELECT id, user_id, date, time FROM bookings WHERE id = ?", id)
-    return respond_json(row.to_py(), status=200)
+    status, body = await run_plan(req, plan_free_booking({"id": id}, {}))
+    return respond_json(body, status=status)
+
+# ---------------- BULK ----------------
+
+MAX_BULK_IDS = 1000
+MAX_BULK_RANGE_DAYS = 366
+
+BULK_SELECTOR = {
+    "ids": {"type": "array", "minItems": 1, "maxItems": MAX_BULK_IDS, "items": {"type": "integer"}},
+    "from": DATE_PARAM,
+    "to": {**DATE_PARAM, "description": "inclusive, defaults to from"},
+}
+
+def _bulk_where(data: dict) -> tuple[str, tuple]:
+    """
+    Bookings chosen by `ids` or by a `from`/`to` date range (inclusive), as a WHERE
+    clause for one set-based statement: json_each for ids, idx_bookings_slot_start for ranges.
+    """
+    if data.get("ids") and data.get("from"):
+        raise PlanError("Use either ids or from/to")
+    if data.get("ids"):
+        return "id IN (SELECT value FROM json_each(?))", (json.dumps(data["ids"]),)
+    if not data.get("from"):
+        raise PlanError("Missing ids or from/to")
+    try:
+        first, last = day_start(data["from"]), day_start(data.get("to") or data["from"])
+    except ValueError as e:
+        raise PlanError(str(e))
+    if last < first or (last - first) // 1440 >= MAX_BULK_RANGE_DAYS:
+        raise PlanError(f"Range must be 1..{MAX_BULK_RANGE_DAYS} days")
+    return "slot_start >= ? AND slot_start < ?", (first, last + 1440)
+
+def _counted(key: str):
+    return lambda results: (200, {key: results[0][1]})
+
+@batch_plan("POST", "/api/bookings/bulk/free")
+def plan_bulk_free(_params: dict, data: dict) -> Plan:
+    where, params = _bulk_where(data)
+    return Plan([(f"UPDATE bookings SET user_id = {ADMIN_ID_SQL} WHERE {where} AND user_id != {ADMIN_ID_SQL}",
+                  params)], _counted("freed"))
+
+@batch_plan("POST", "/api/bookings/bulk/delete")
+def plan_bulk_delete(_params: dict, data: dict) -> Plan:
+    where, params = _bulk_where(data)
+    if data.get("only_free"):
+        # `+` keeps SQLite on the id / slot_start lookup instead of walking every free slot by user_id
+        where += f" AND +user_id = {ADMIN_ID_SQL}"
+    return Plan([(f"DELETE FROM bookings WHERE {where}", params)], _counted("deleted"))
+
+@batch_plan("POST", "/api/bookings/bulk/reassign")
+def plan_bulk_reassign(_params: dict, data: dict) -> Plan:
+    where, params = _bulk_where(data)
+    if data.get("user_id") is not None:
+        key, who = "id", data["user_id"]
+    elif data.get("telegram_id") is not None:
+        key, who = "telegram_id", data["telegram_id"]
+    else:
+        raise PlanError("Missing user_id or telegram_id of the new owner")
+    target = f"(SELECT id FROM users WHERE {key} = ?)"
+
+    def finish(results):
+        (_rows, reassigned), (owner, _) = results
+        if owner[0]["user_id"] is None:
+            return 404, {"error": "User not found"}
+        return 200, {"reassigned": reassigned}
+    return Plan([(f"UPDATE bookings SET user_id = {target} WHERE {where} "
+                  f"AND EXISTS {target} AND user_id != {target}",
+                  (who, *params, who, who)),
+                 (f"SELECT {target} AS user_id", (who,))], finish)
+
+async def _run_bulk(req: Request, planner) -> Response:
+    data = await json_body(req) or {}
+    try:
+        plan = planner({}, data)
+    except PlanError as e:
+        return respond_json({"error": str(e)}, status=400)
+    status, body = await run_plan(req, plan)
+    return respond_json(body, status=status)
+
+@route("POST", "/api/bookings/bulk/free", summary="Free taken slots by ids or date range",
+       request_body={"type": "object", "properties": BULK_SELECTOR}, tags=["bulk"])
+async def bulk_free(req: Request):
+    return await _run_bulk(req, plan_bulk_free)
+
+@route("POST", "/api/bookings/bulk/delete", summary="Delete slots by ids or date range (only_free: keep taken ones)",
+       request_body={"type": "object", "properties": {**BULK_SELECTOR, "only_free": {"type": "boolean"}}},
+       tags=["bulk"])
+async def bulk_delete(req: Request):
+    return await _run_bulk(req, plan_bulk_delete)
+
+@route("POST", "/api/bookings/bulk/reassign", summary="Give bookings (ids or date range) to another user",
+       request_body={"type": "object", "properties": {
+           **BULK_SELECTOR, "user_id": {"type": "integer"},
+           "telegram_id": {"type": "integer", "description": "instead of user_id"}}},
+       tags=["bulk"],
+       responses={"200": {"description": "Number of bookings moved"}, "404": {"description": "User not found"}})
+async def bulk_reassign(req: Request):
+    return await _run_bulk(req, plan_bulk_reassign)
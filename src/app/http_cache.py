@@ -0,0 +1,77 @@
+# src/app/http_cache.py
+"""
+Conditional GET for read endpoints.
+
+The ETag of a response is derived from the request URL and the change counters
+of the tables it reads (`table_versions`, bumped by triggers on every write).
+A matching If-None-Match costs one lookup in that table instead of the full query.
+Without If-None-Match the lookup rides along with the handler's first D1 query
+(db.piggyback): in the same batch, or next to a raw() read, so tagging a
+response adds no round trip.
+"""
+import hashlib
+from functools import wraps
+from typing import Callable, Any
+from workers import Request, Response  # type: ignore
+from .db import d1_all, piggyback, piggyback_rows, _to_py
+
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+
+def etag_matches(req: Request, etag: str) -> bool:
+    header = req.headers.get("If-None-Match") if getattr(req, "headers", None) is not None else None
+    if not header:
+        return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(None, status=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+
+def _versions_sql(tables: tuple[str, ...]) -> str:
+    return f"SELECT name, version FROM table_versions WHERE name IN ({', '.join('?' for _ in tables)})"
+
+
+def _versions(rows, tables: tuple[str, ...]) -> str:
+    versions = {r["name"]: r["version"] for r in map(_to_py, rows)}
+    return ";".join(f"{t}:{versions.get(t, 0)}" for t in tables)
+
+
+async def table_versions(req: Request, tables: tuple[str, ...]) -> str:
+    return _versions(await d1_all(req, _versions_sql(tables), *tables), tables)
+
+
+def _etag(req: Request, versions: str) -> str:
+    return 'W/"' + hashlib.sha1(f"{req.url}|{versions}".encode()).hexdigest()[:20] + '"'
+
+
+def conditional(*tables: str, cache_control: str = DEFAULT_CACHE_CONTROL):
+    """
+    Wrap a GET handler: answer 304 when the tables it reads have not changed since
+    the client's ETag, otherwise run it and tag a 200 response.
+    """
+    def decorator(fn: Callable[..., Any]):
+        @wraps(fn)
+        async def wrapper(req: Request, **params):
+            headers = getattr(req, "headers", None)
+            etag = None
+            if headers is not None and headers.get("If-None-Match"):
+                etag = _etag(req, await table_versions(req, tables))
+                if etag_matches(req, etag):
+                    return not_modified(etag, cache_control)
+            else:
+                # Same D1 batch as the handler's query: the tag matches the data it read
+                piggyback(req, _versions_sql(tables), *tables)
+            response = await fn(req, **params)
+            if getattr(response, "status", 200) != 200 or not hasattr(response, "headers"):
+                return response
+            if etag is None:
+                rows = piggyback_rows(req)
+                etag = _etag(req, _versions(rows, tables) if rows is not None else await table_versions(req, tables))
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = cache_control
+            return response
+        return wrapper
+    return decorator
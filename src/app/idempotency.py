@@ -0,0 +1,144 @@
+# src/app/idempotency.py
+"""
+Idempotency-Key support for write endpoints.
+
+The first request with a given key claims it in D1 (`idempotency_keys`, a pending
+row with status 0) before the handler runs; its response (status < 500) then
+replaces the pending row and goes into a small in-isolate LRU. A retry with the
+same key and the same request gets the stored response back without running the
+handler again, or 409 with Retry-After while the first one is still in flight;
+the same key with a different request is rejected with 422. A 5xx or an
+exception releases the claim so that the next retry runs the handler.
+"""
+import hashlib, json, time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Any
+from workers import Request, Response  # type: ignore
+from .router import json_body, context
+from .db import d1_first, d1_run, _to_py
+
+IDEMPOTENCY_TTL = 24 * 3600
+# A claim whose handler never finished (isolate killed) stops blocking retries after this
+PENDING_TTL = 30
+PENDING_RETRY_AFTER = 1  # seconds
+PENDING = 0  # status of a claimed key without a response yet
+IDEMPOTENCY_KEY_MAX_LEN = 255
+LRU_MAX_ENTRIES = 1024
+
+# key -> (request_hash, status, body, content_type, expires_at)
+_recent: "OrderedDict[str, tuple[str, int, str, str, int]]" = OrderedDict()
+
+
+def _remember(key: str, entry: tuple) -> None:
+    _recent[key] = entry
+    _recent.move_to_end(key)
+    while len(_recent) > LRU_MAX_ENTRIES:
+        _recent.popitem(last=False)
+
+
+def _recent_entry(key: str, now: int):
+    entry = _recent.get(key)
+    if entry is not None and entry[4] > now:
+        _recent.move_to_end(key)
+        return entry
+    return None
+
+
+async def _claim(req: Request, key: str, request_hash: str, now: int) -> bool:
+    """Reserve the key for this request; False if someone holds or has answered it."""
+    # A row left after expiry (not purged yet) is taken over
+    row = await d1_first(req, "INSERT INTO idempotency_keys (key, request_hash, status, body, content_type, expires_at) "
+                              "VALUES (?, ?, ?, '', 'application/json', ?) "
+                              "ON CONFLICT(key) DO UPDATE SET request_hash = excluded.request_hash, "
+                              "status = excluded.status, body = '', expires_at = excluded.expires_at "
+                              "WHERE idempotency_keys.expires_at <= ? RETURNING key",
+                         key, request_hash, PENDING, now + PENDING_TTL, now)
+    return row is not None
+
+
+async def _lookup(req: Request, key: str, now: int):
+    row = await d1_first(req, "SELECT request_hash, status, body, content_type, expires_at FROM idempotency_keys "
+                              "WHERE key = ? AND expires_at > ?", key, now)
+    if not row:
+        return None
+    row = _to_py(row)
+    entry = (row["request_hash"], row["status"], row["body"], row["content_type"], row["expires_at"])
+    if entry[1] != PENDING:
+        _remember(key, entry)
+    return entry
+
+
+def _replay(entry, replayed: bool = True) -> Response:
+    _hash, status, body, content_type, _exp = entry
+    headers = {"Content-Type": content_type}
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return Response(body, status=status, headers=headers)
+
+
+def _error(status: int, message: str, headers: dict | None = None) -> Response:
+    return Response(json.dumps({"error": message}), status=status,
+                    headers={"Content-Type": "application/json", **(headers or {})})
+
+
+def idempotent(fn: Callable[..., Any]):
+    @wraps(fn)
+    async def wrapper(req: Request, **params):
+        headers = getattr(req, "headers", None)
+        key = headers.get("Idempotency-Key") if headers is not None else None
+        if not key:
+            return await fn(req, **params)
+        if len(key) > IDEMPOTENCY_KEY_MAX_LEN:
+            return _error(400, "Idempotency-Key is too long")
+
+        body = await json_body(req)
+        request_hash = hashlib.sha256(
+            f"{req.method} {context(req).path}\n{json.dumps(body, sort_keys=True)}".encode()
+        ).hexdigest()
+        now = int(time.time())
+        stored = _recent_entry(key, now)
+        if stored is None and not await _claim(req, key, request_hash, now):
+            stored = await _lookup(req, key, now)
+            if stored is None:
+                # The holder released or let the claim expire between the two queries
+                return _error(409, "Request with this Idempotency-Key is in progress",
+                              {"Retry-After": str(PENDING_RETRY_AFTER)})
+        if stored is not None:
+            if stored[0] != request_hash:
+                return _error(422, "Idempotency-Key was used for a different request")
+            if stored[1] == PENDING:
+                return _error(409, "Request with this Idempotency-Key is in progress",
+                              {"Retry-After": str(PENDING_RETRY_AFTER)})
+            return _replay(stored)
+
+        try:
+            response = await fn(req, **params)
+        except BaseException:
+            await _release(req, key)
+            raise
+        if response.status >= 500:
+            await _release(req, key)
+            return response
+        text = await response.text()
+        content_type = response.headers.get("Content-Type") or "application/json"
+        entry = (request_hash, response.status, text, content_type, now + IDEMPOTENCY_TTL)
+        await d1_run(req, "UPDATE idempotency_keys SET status = ?, body = ?, content_type = ?, expires_at = ? "
+                          "WHERE key = ? AND status = ?", response.status, text, content_type, entry[4], key, PENDING)
+        _remember(key, entry)
+        return _replay(entry, replayed=False)
+    return wrapper
+
+
+async def _release(req: Request, key: str) -> None:
+    try:
+        await d1_run(req, "DELETE FROM idempotency_keys WHERE key = ? AND status = ?", key, PENDING)
+    except Exception:
+        pass  # the claim expires after PENDING_TTL anyway
+
+
+async def purge_expired(env) -> int:
+    """Delete expired keys; called from the Worker's scheduled handler."""
+    res = await env.DB.prepare("DELETE FROM idempotency_keys WHERE expires_at <= ?").bind(int(time.time())).run()
+    meta = getattr(res, "meta", None)
+    return int(getattr(meta, "changes", 0) or 0)
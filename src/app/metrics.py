@@ -0,0 +1,159 @@
+# src/app/metrics.py
+"""
+Per-request timing, in-isolate histograms and sampled structured logs.
+
+A RequestTimer lives in `request.scope["timer"]` for the duration of a request;
+db.py adds every D1 statement to it. `finish()` turns it into a Server-Timing
+header, feeds the per-route histograms served by /metrics and maybe logs a line.
+"""
+import json, random, time
+
+# Seconds, Prometheus style
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Share of successful requests that get a log line; 5xx are always logged
+LOG_SAMPLE_RATE = 0.01
+SERVER_TIMING_MAX_STATEMENTS = 10
+# Smoothed D1 statement latency (admission control sheds reads on it)
+D1_EWMA_ALPHA = 0.2
+D1_EWMA_HALF_LIFE = 5.0  # seconds; the estimate decays while no statements run
+
+
+class RequestTimer:
+    __slots__ = ("start", "method", "route", "match_ms", "d1")
+
+    def __init__(self, method: str):
+        self.start = time.perf_counter()
+        self.method = method
+        self.route = "unmatched"
+        self.match_ms = 0.0
+        self.d1: list[float] = []  # duration of each statement, ms
+
+    def record_d1(self, seconds: float) -> None:
+        self.d1.append(seconds * 1000)
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self, total_ms: float) -> str:
+        parts = [f"total;dur={total_ms:.2f}", f"route;dur={self.match_ms:.3f}",
+                 f'd1;dur={sum(self.d1):.2f};desc="{len(self.d1)} queries"']
+        parts += [f"d1-{i};dur={ms:.2f}" for i, ms in enumerate(self.d1[:SERVER_TIMING_MAX_STATEMENTS], 1)]
+        return ", ".join(parts)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+# (method, route) -> Histogram
+_request_seconds: dict[tuple[str, str], Histogram] = {}
+_d1_seconds: dict[tuple[str, str], Histogram] = {}
+# (method, route, status) -> count
+_requests_total: dict[tuple[str, str, int], int] = {}
+# (method, route) -> count
+_d1_statements_total: dict[tuple[str, str], int] = {}
+# (name, sorted labels) -> count, for events that are not per-route timings
+_counters: dict[tuple[str, tuple], int] = {}
+# [ms, perf_counter of the last statement]
+_d1_ewma = [0.0, 0.0]
+
+
+def begin(request) -> RequestTimer:
+    timer = RequestTimer(request.method)
+    request.scope["timer"] = timer
+    return timer
+
+
+def timer_of(req) -> RequestTimer | None:
+    scope = getattr(req, "scope", None)
+    return scope.get("timer") if isinstance(scope, dict) else None
+
+
+def finish(timer: RequestTimer, response) -> None:
+    total_ms = timer.elapsed_ms()
+    response.headers["Server-Timing"] = timer.server_timing(total_ms)
+
+    key = (timer.method, timer.route)
+    _request_seconds.setdefault(key, Histogram()).observe(total_ms / 1000)
+    d1_hist = _d1_seconds.setdefault(key, Histogram())
+    for ms in timer.d1:
+        d1_hist.observe(ms / 1000)
+    _d1_statements_total[key] = _d1_statements_total.get(key, 0) + len(timer.d1)
+    status = int(getattr(response, "status", 0) or 0)
+    _requests_total[key + (status,)] = _requests_total.get(key + (status,), 0) + 1
+
+    if status >= 500 or random.random() < LOG_SAMPLE_RATE:
+        log_event("request", method=timer.method, route=timer.route, status=status,
+                  total_ms=round(total_ms, 2), d1_count=len(timer.d1), d1_ms=round(sum(timer.d1), 2))
+
+
+def inc(name: str, **labels) -> None:
+    key = (name, tuple(sorted(labels.items())))
+    _counters[key] = _counters.get(key, 0) + 1
+
+
+def observe_d1(seconds: float) -> None:
+    ms = seconds * 1000
+    _d1_ewma[0] = d1_latency_ms() * (1 - D1_EWMA_ALPHA) + ms * D1_EWMA_ALPHA
+    _d1_ewma[1] = time.perf_counter()
+
+
+def d1_latency_ms() -> float:
+    ewma, at = _d1_ewma
+    if not ewma:
+        return 0.0
+    return ewma * 0.5 ** ((time.perf_counter() - at) / D1_EWMA_HALF_LIFE)
+
+
+def log_event(event: str, **fields) -> None:
+    """One JSON line; Workers Logs index the fields."""
+    print(json.dumps({"event": event, **fields}, default=str))
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def _histogram_lines(name: str, series: dict) -> list[str]:
+    lines = [f"# TYPE {name} histogram"]
+    for (method, route), h in sorted(series.items()):
+        cumulative = 0
+        for bound, n in zip(BUCKETS, h.counts):
+            cumulative += n
+            lines.append(f"{name}_bucket{_labels(method=method, route=route, le=bound)} {cumulative}")
+        lines.append(f"{name}_bucket{_labels(method=method, route=route, le='+Inf')} {h.count}")
+        lines.append(f"{name}_sum{_labels(method=method, route=route)} {h.sum:.6f}")
+        lines.append(f"{name}_count{_labels(method=method, route=route)} {h.count}")
+    return lines
+
+
+def render_prometheus() -> str:
+    lines = _histogram_lines("http_request_duration_seconds", _request_seconds)
+    lines += _histogram_lines("d1_statement_duration_seconds", _d1_seconds)
+    lines.append("# TYPE http_requests_total counter")
+    for (method, route, status), n in sorted(_requests_total.items()):
+        lines.append(f"http_requests_total{_labels(method=method, route=route, status=status)} {n}")
+    lines.append("# TYPE d1_statements_total counter")
+    for (method, route), n in sorted(_d1_statements_total.items()):
+        lines.append(f"d1_statements_total{_labels(method=method, route=route)} {n}")
+    for name in sorted({name for name, _labels_ in _counters}):
+        lines.append(f"# TYPE {name} counter")
+        for (counter, labels), n in sorted(_counters.items()):
+            if counter == name:
+                lines.append(f"{name}{_labels(**dict(labels))} {n}")
+    lines.append("# TYPE d1_latency_ewma_ms gauge")
+    lines.append(f"d1_latency_ewma_ms {d1_latency_ms():.3f}")
+    return "\n".join(lines) + "\n"
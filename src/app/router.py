@@ -1,53 +1,349 @@
 from workers import Request, Response  # type: ignore
-import json, re
+import importlib, json, re
+from functools import wraps
 from urllib.parse import urlsplit, parse_qs
 from typing import Callable, Any
+from .validation import ValidationError, compile_params, compile_value, openapi_parameters
 
 # -------------------------------
 # Minimal router + OpenAPI registry
 # -------------------------------
 _routes: list[tuple[str, str, re.Pattern[str], list[str], Callable[..., Any], dict]] = []
 
+_ANNOTATION_TYPES = {int: "integer", float: "number", bool: "boolean", str: "string"}
+
 def route(method: str, path: str, *, summary: str = "", request_body: dict | None = None,
-          responses: dict | None = None, tags: list[str] | None = None):
+          responses: dict | None = None, tags: list[str] | None = None,
+          params: dict[str, dict] | None = None, query: dict[str, dict] | None = None,
+          critical: bool = False):
     """
     Register endpoint and OpenAPI metadata. Path params are {name}.
+
+    `params` / `query` / `request_body` are schemas (see app/validation.py), compiled
+    here once and checked before the handler runs; a failure is a 400. Path params
+    not listed in `params` take their type from the handler annotation (`id: int`).
+    Validated query values are in `args_of(req)`. `critical` reads are never shed
+    under D1 pressure (app/admission.py).
     """
     def decorator(fn: Callable[..., Any]):
-        param_names = re.findall(r"{(\w+)}", path)
-        pattern_str = "^" + re.sub(r"{(\w+)}", r"(?P<\1>[^/]+)", path) + "$"
-        pattern = re.compile(pattern_str)
-        meta = {
+        annotations = getattr(fn, "__annotations__", {})
+        path_schemas = {name: (params or {}).get(name) or {"type": _ANNOTATION_TYPES.get(annotations.get(name), "string")}
+                        for name in re.findall(r"{(\w+)}", path)}
+        checks = _checks(path_schemas, request_body)
+        _add(method, path, _validated(fn, checks, query), {
             "summary": summary or fn.__name__,
             "requestBody": request_body,
             "responses": responses or {"200": {"description": "OK"}},
             "tags": tags or [],
-        }
-        _routes.append((method.upper(), path, pattern, param_names, fn, meta))
+            "path": path,
+            "parameters": openapi_parameters(path_schemas, query or {}),
+            "critical": critical,
+            "checks": checks,
+        })
         return fn
     return decorator
 
+def _checks(path_schemas: dict, body: dict | None) -> tuple:
+    """Compiled (path, body) validators of a route; None where there is nothing to check."""
+    typed = any(schema != {"type": "string"} for schema in path_schemas.values())
+    return (compile_params(path_schemas, "path") if typed else None,
+            compile_value(body, "body") if body else None)
+
+def validate_operation(meta: dict, path_values: dict, body) -> dict:
+    """
+    A route's path and body checks without a request (operations of POST /api/batch).
+    Returns the typed path values; raises ValidationError like the route would.
+    """
+    check_path, check_body = meta.get("checks") or (None, None)
+    if check_path is not None:
+        path_values = check_path(path_values)
+    if check_body is not None:
+        check_body(body)
+    return path_values
+
+def _validated(fn: Callable[..., Any], checks: tuple, query: dict | None):
+    """The handler behind compiled validators; routes without any schema get fn itself."""
+    check_path, check_body = checks
+    if check_path is None and check_body is None and not query:
+        return fn
+    check_query = compile_params(query, "query") if query else None
+
+    @wraps(fn)
+    async def handler(req, **path_values):
+        try:
+            if check_path is not None:
+                path_values = check_path(path_values)
+            if check_query is not None:
+                context(req).args = check_query(context(req).query)
+            if check_body is not None:
+                check_body(await json_body(req))
+        except ValidationError as e:
+            return respond_json({"error": str(e)}, status=400)
+        return await fn(req, **path_values)
+    return handler
+
+def _add(method: str, path: str, fn: Callable[..., Any], meta: dict):
+    global _compiled
+    method = method.upper()
+    param_names = re.findall(r"{(\w+)}", path)
+    pattern_str = "^" + re.sub(r"{(\w+)}", r"(?P<\1>[^/]+)", path) + "$"
+    entry = (method, path, re.compile(pattern_str), param_names, fn, meta)
+    for i, (m, p, *_rest, old, _meta) in enumerate(_routes):
+        if m == method and p == path and isinstance(old, _Deferred):
+            _routes[i] = entry  # the module declared in the manifest has been imported
+            break
+    else:
+        _routes.append(entry)
+    _compiled = None
+
+# -------------------------------
+# Lazy registration
+# -------------------------------
+class _Deferred:
+    """Stands in for a handler whose module has not been imported yet."""
+    __slots__ = ("module",)
+
+    def __init__(self, module: str):
+        self.module = module
+
+def declare(manifest: dict[str, list[tuple[str, str]]]):
+    """
+    Register routes from a {module: [(method, path), ...]} manifest without importing
+    the modules. A module is imported the first time one of its routes matches; its
+    @route decorators then replace the placeholders.
+    """
+    known = {(m, p) for m, p, *_rest in _routes}
+    for module, entries in manifest.items():
+        for method, path in entries:
+            if (method.upper(), path) in known:
+                continue  # module already imported
+            _add(method, path, _Deferred(module), {
+                "summary": "", "requestBody": None, "responses": {}, "tags": [], "path": path,
+            })
+
+def _load(module: str):
+    importlib.import_module(module)
+    missing = [(i, m, p) for i, (m, p, *_rest, fn, _meta) in enumerate(_routes)
+               if isinstance(fn, _Deferred) and fn.module == module]
+    if missing:
+        global _compiled
+        for i, _m, _p in reversed(missing):
+            del _routes[i]
+        _compiled = None
+        raise LookupError(f"{module} does not register " + ", ".join(f"{m} {p}" for _i, m, p in missing))
+
+def load_all():
+    """Import every declared module (OpenAPI needs the real metadata)."""
+    for module in sorted({fn.module for *_rest, fn, _meta in _routes if isinstance(fn, _Deferred)}):
+        _load(module)
+
+# -------------------------------
+# Compiled dispatch table
+# -------------------------------
+class _Node:
+    """One path segment. Static children win over the {param} child."""
+    __slots__ = ("static", "param", "leaf")
+
+    def __init__(self):
+        self.static: dict[str, "_Node"] = {}
+        self.param: "_Node | None" = None
+        self.leaf: tuple[Callable[..., Any], list[str], dict] | None = None
+
+# method -> {path: (fn, meta)} for routes without params, method -> trie root otherwise
+_compiled: tuple[dict[str, dict[str, tuple]], dict[str, _Node]] | None = None
+
+def _compile():
+    static: dict[str, dict[str, tuple]] = {}
+    tries: dict[str, _Node] = {}
+    for method, path, _regex, params, fn, meta in _routes:
+        if not params:
+            # first registration wins, as with the old linear scan
+            static.setdefault(method, {}).setdefault(path, (fn, meta))
+            continue
+        node = tries.setdefault(method, _Node())
+        for seg in path.strip("/").split("/"):
+            if seg.startswith("{") and seg.endswith("}"):
+                node.param = node.param or _Node()
+                node = node.param
+            else:
+                node = node.static.setdefault(seg, _Node())
+        if node.leaf is None:
+            node.leaf = (fn, params, meta)
+    return static, tries
+
+def _walk(node: _Node, segs: list[str], i: int, values: list[str]):
+    if i == len(segs):
+        return node.leaf
+    child = node.static.get(segs[i])
+    if child is not None:
+        found = _walk(child, segs, i + 1, values)
+        if found:
+            return found
+    if node.param is not None and segs[i]:
+        values.append(segs[i])
+        found = _walk(node.param, segs, i + 1, values)
+        if found:
+            return found
+        values.pop()
+    return None
+
+def _lookup(compiled, method: str, pathname: str):
+    static, tries = compiled
+    hit = static.get(method, {}).get(pathname)
+    if hit:
+        return hit[0], {}, hit[1]
+    root = tries.get(method)
+    if root is None:
+        return None, None, None
+    values: list[str] = []
+    leaf = _walk(root, pathname.strip("/").split("/"), 0, values)
+    if not leaf:
+        return None, None, None
+    fn, names, meta = leaf
+    return fn, dict(zip(names, values)), meta
+
 def match(method: str, pathname: str):
-    for m, path, regex, params, fn, meta in _routes:
-        mobj = (m == method) and regex.match(pathname)
-        if mobj:
-            return fn, mobj.groupdict(), meta
-    return None, None, None
+    global _compiled
+    if _compiled is None:
+        _compiled = _compile()
+    found = _lookup(_compiled, method, pathname)
+    if isinstance(found[0], _Deferred):
+        _load(found[0].module)
+        return match(method, pathname)
+    return found
+
+def allowed_methods(pathname: str) -> list[str]:
+    """
+    Methods registered for this path; used to tell 405 from 404 on a miss.
+    OPTIONS is left out: the `/{any}` preflight route matches every one-segment
+    path, and preflight is answered before routing anyway.
+    """
+    global _compiled
+    if _compiled is None:
+        _compiled = _compile()
+    static, tries = _compiled
+    methods = (set(static) | set(tries)) - {"OPTIONS"}
+    return sorted(m for m in methods if _lookup(_compiled, m, pathname)[0] is not None)
+
+# -------------------------------
+# Request context
+# -------------------------------
+class RequestContext:
+    """What the router knows about a request, parsed at most once (kept in req.scope["ctx"])."""
+    __slots__ = ("path", "query_string", "_query", "args")
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.path = parts.path or "/"
+        self.query_string = parts.query or ""
+        self._query: dict[str, str] | None = None
+        self.args: dict[str, Any] = {}  # query values validated against the route's schema
+
+    @property
+    def query(self) -> dict[str, str]:
+        """First value of every query parameter."""
+        if self._query is None:
+            self._query = {k: v[0] for k, v in parse_qs(self.query_string).items()}
+        return self._query
+
+def context(req) -> RequestContext:
+    scope = getattr(req, "scope", None)
+    if not isinstance(scope, dict):
+        return RequestContext(str(req.url))
+    ctx = scope.get("ctx")
+    if ctx is None:
+        ctx = scope["ctx"] = RequestContext(str(req.url))
+    return ctx
+
+def args_of(req) -> dict[str, Any]:
+    return context(req).args
 
 # -------------------------------
 # Helpers
 # -------------------------------
 def split_url(request: Request) -> tuple[str, str]:
-    parts = urlsplit(str(request.url))
-    return (parts.path or "/"), (parts.query or "")
+    ctx = context(request)
+    return ctx.path, ctx.query_string
 
 async def json_body(req):
+    """Parsed JSON body or None. Memoized in req.scope: the body stream can be read only once."""
+    scope = getattr(req, "scope", None)
+    if isinstance(scope, dict) and "json_body" in scope:
+        return scope["json_body"]
     try:
-        return await req.json()
+        data = await req.json()
     except Exception:
-        return None
+        data = None
+    if isinstance(scope, dict):
+        scope["json_body"] = data
+    return data
+
+
+async def body_lines(req):
+    """
+    Lines of the request body (str, without the newline). On Workers the body
+    stream is read chunk by chunk, so memory does not grow with the body size;
+    without a stream (local stand-in) the whole text is split.
+    """
+    stream = getattr(req, "body", None) or getattr(getattr(req, "js_object", None), "body", None)
+    if getattr(stream, "getReader", None) is None:
+        for line in (await req.text()).splitlines():
+            yield line
+        return
+    reader = stream.getReader()
+    pending = b""
+    while True:
+        chunk = await reader.read()
+        if chunk.done:
+            break
+        pending += bytes(chunk.value.to_bytes())
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8").rstrip("\r")
+
+async def _aiter(chunks):
+    if hasattr(chunks, "__aiter__"):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+async def respond_stream(chunks, status: int = 200, content_type: str = "application/json"):
+    """
+    Response whose body is produced piecewise (sync or async iterable of str).
+    On Workers the chunks go into a TransformStream as they are produced, so the
+    body is sent chunked; an error while producing them aborts the stream. Without
+    the JS runtime (local stand-in) they are joined and an error propagates.
+    """
+    headers = {"Content-Type": content_type}
+    try:
+        from js import TransformStream, TextEncoder  # type: ignore
+    except ImportError:
+        body = "".join([chunk async for chunk in _aiter(chunks)])
+        return Response(body, status=status, headers=headers)
+
+    stream = TransformStream.new()
+    writer = stream.writable.getWriter()
+    encoder = TextEncoder.new()
 
+    async def pump():
+        try:
+            async for chunk in _aiter(chunks):
+                await writer.write(encoder.encode(chunk))
+        except Exception as e:
+            # The 200 is already sent: abort so the client sees a broken body, not a short complete one
+            from . import metrics
+            metrics.log_event("stream_error", content_type=content_type, error=repr(e))
+            await writer.abort(repr(e))
+            return
+        await writer.close()
 
+    import asyncio  # only streamed responses need it; keeps it off the cold-start path
+    asyncio.ensure_future(pump())
+    return Response(stream.readable, status=status, headers=headers)
 
 def respond_json(data, status=200):
     return Response(json.dumps(data), status=status, headers={
@@ -0,0 +1,71 @@
+# src/app/schema.py
+"""
+Isolate-level schema readiness cache.
+
+The schema is probed once per isolate (on first use of `/api/db/ping` or `/ready`)
+and the result is kept in module state. A failed D1 statement marks the cache
+stale, so the next readiness check probes again.
+"""
+import time
+
+REQUIRED_TABLES = ("users", "bookings", "table_versions", "slot_days", "idempotency_keys")
+# Number prefix of the newest file in migrations/
+SCHEMA_VERSION = 15
+
+_state: dict = {
+    "checked": False,
+    "ready": False,
+    "tables": [],
+    "migration": None,
+    "checked_at": None,
+    "error": None,
+}
+
+
+def _migration_number(name) -> int | None:
+    prefix = str(name or "").split("_", 1)[0]
+    return int(prefix) if prefix.isdigit() else None
+
+
+async def _probe(env) -> dict:
+    from .db import _to_py  # db imports this module for mark_stale
+    db = env.DB
+    res = await db.prepare("SELECT name FROM sqlite_master WHERE type = 'table'").all()
+    tables = sorted(_to_py(r)["name"] for r in res.results)
+
+    migration = None
+    if "d1_migrations" in tables:
+        row = await db.prepare("SELECT name FROM d1_migrations ORDER BY id DESC LIMIT 1").first()
+        migration = _to_py(row)["name"] if row else None
+
+    missing = [t for t in REQUIRED_TABLES if t not in tables]
+    level = _migration_number(migration)
+    migration_ok = level is None or level >= SCHEMA_VERSION
+    return {
+        "ready": not missing and migration_ok,
+        "tables": tables,
+        "missing_tables": missing,
+        "migration": migration,
+        "expected_migration": SCHEMA_VERSION,
+    }
+
+
+async def ensure_schema(env, force: bool = False) -> dict:
+    """Return the cached schema state, probing D1 only if it is unknown or stale."""
+    if _state["checked"] and not force:
+        return _state
+    try:
+        _state.update(await _probe(env), error=None)
+    except Exception as e:
+        _state.update(ready=False, error=str(e))
+        _state["checked_at"] = time.time()
+        _state["checked"] = False
+        return _state
+    _state["checked"] = True
+    _state["checked_at"] = time.time()
+    return _state
+
+
+def mark_stale() -> None:
+    """Called after a D1 error: the next readiness check re-probes the schema."""
+    _state["checked"] = False
@@ -1,8 +1,10 @@
 from workers import Response  # type: ignore
-import json
-from .router import _routes, respond_json
+import hashlib, json
+from .router import _routes, load_all
+from .http_cache import etag_matches, not_modified
 
 def openapi_schema():
+    load_all()  # routes are declared lazily; the document needs every module's metadata
     paths: dict = {}
     for method, path, _regex, _params, _fn, meta in _routes:
         if path not in paths:
@@ -18,6 +20,8 @@ def openapi_schema():
             }
         if meta["tags"]:
             op["tags"] = meta["tags"]
+        if meta.get("parameters"):
+            op["parameters"] = meta["parameters"]
         paths[path][method.lower()] = op
 
     return {
@@ -46,6 +50,20 @@ SWAGGER_HTML = """<!DOCTYPE html>
 def swagger_page() -> Response:
     return Response(SWAGGER_HTML, headers={"content-type": "text/html; charset=utf-8"})
 
-def openapi_json() -> Response:
-    return Response(json.dumps(openapi_schema()),
-                    headers={"content-type": "application/json; charset=utf-8"})
\ No newline at end of file
+OPENAPI_CACHE_CONTROL = "public, max-age=300"
+# (body, etag); built on the first /openapi.json, the route table is fixed after load_all()
+_openapi_cache: tuple[str, str] | None = None
+
+def _openapi_document() -> tuple[str, str]:
+    global _openapi_cache
+    if _openapi_cache is None:
+        body = json.dumps(openapi_schema())
+        _openapi_cache = (body, '"' + hashlib.sha1(body.encode()).hexdigest()[:20] + '"')
+    return _openapi_cache
+
+def openapi_json(request=None) -> Response:
+    body, etag = _openapi_document()
+    if request is not None and etag_matches(request, etag):
+        return not_modified(etag, OPENAPI_CACHE_CONTROL)
+    return Response(body, headers={"content-type": "application/json; charset=utf-8",
+                                   "ETag": etag, "Cache-Control": OPENAPI_CACHE_CONTROL})
@@ -0,0 +1,170 @@
+# src/app/validation.py
+"""
+Declarative parameter and body schemas for @route.
+
+Schemas are the JSON-Schema subset OpenAPI already uses (type, enum, minimum,
+maximum, minLength, maxLength, pattern, format: date, default, items, minItems,
+maxItems, properties, required). They are compiled into plain closures once,
+when the route is registered; the same dicts go into openapi.json.
+"""
+import re
+from datetime import date
+from typing import Any, Callable
+
+Check = Callable[[Any], Any]
+
+
+class ValidationError(ValueError):
+    """Bad path/query parameter or body; reported as 400 with the message."""
+
+
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_TRUE, _FALSE = {"1", "true", "yes"}, {"0", "false", "no"}
+
+
+def _from_string(kind: str | None, label: str) -> Check:
+    """Query/path values arrive as strings; convert them to the declared type."""
+    def to_int(raw):
+        try:
+            return int(raw)
+        except ValueError:
+            raise ValidationError(f"Invalid value for {label}: {raw}")
+
+    def to_float(raw):
+        try:
+            return float(raw)
+        except ValueError:
+            raise ValidationError(f"Invalid value for {label}: {raw}")
+
+    def to_bool(raw):
+        value = raw.lower()
+        if value in _TRUE or value in _FALSE:
+            return value in _TRUE
+        raise ValidationError(f"Invalid value for {label}: {raw}")
+
+    return {"integer": to_int, "number": to_float, "boolean": to_bool}.get(kind, str)
+
+
+_JSON_TYPES = {
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+}
+
+
+def _constraints(schema: dict, label: str) -> list[Check]:
+    checks: list[Check] = []
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+        def enum(v):
+            if v not in allowed:
+                raise ValidationError(f"{label} must be one of {', '.join(map(str, allowed))}")
+        checks.append(enum)
+    if "minimum" in schema or "maximum" in schema:
+        lo, hi = schema.get("minimum"), schema.get("maximum")
+        expected = (f"between {lo} and {hi}" if lo is not None and hi is not None
+                    else f">= {lo}" if lo is not None else f"<= {hi}")
+        def bounds(v):
+            if (lo is not None and v < lo) or (hi is not None and v > hi):
+                raise ValidationError(f"{label} must be {expected}")
+        checks.append(bounds)
+    if "minLength" in schema or "maxLength" in schema:
+        lo, hi = schema.get("minLength", 0), schema.get("maxLength")
+        def length(v):
+            if len(v) < lo or (hi is not None and len(v) > hi):
+                raise ValidationError(f"{label} has the wrong length")
+        checks.append(length)
+    if "pattern" in schema:
+        pattern = re.compile(schema["pattern"])
+        def matches(v):
+            if not pattern.search(v):
+                raise ValidationError(f"{label} has the wrong format")
+        checks.append(matches)
+    if schema.get("format") == "date":
+        def is_date(v):
+            try:
+                if _DATE_RE.match(v):
+                    date.fromisoformat(v)
+                    return
+            except ValueError:
+                pass
+            raise ValidationError(f"{label} must be a date YYYY-MM-DD")
+        checks.append(is_date)
+    if "minItems" in schema or "maxItems" in schema:
+        lo, hi = schema.get("minItems", 0), schema.get("maxItems")
+        def items_count(v):
+            if len(v) < lo or (hi is not None and len(v) > hi):
+                raise ValidationError(f"{label} must have {lo}..{hi if hi is not None else ''} items")
+        checks.append(items_count)
+    return checks
+
+
+def compile_value(schema: dict, label: str) -> Check:
+    """Validator for a JSON value (request body or a part of it); returns the value."""
+    kind = schema.get("type")
+    is_type = _JSON_TYPES.get(kind)
+    checks = _constraints(schema, label)
+    item = compile_value(schema["items"], f"{label}[]") if kind == "array" and "items" in schema else None
+    fields = {name: compile_value(sub, f"{label}.{name}" if label != "body" else name)
+              for name, sub in (schema.get("properties") or {}).items()} if kind == "object" else {}
+    required = tuple(schema.get("required") or ()) if kind == "object" else ()
+
+    def check(value):
+        if is_type is not None and not is_type(value):
+            raise ValidationError(f"{label} must be {'an' if kind[0] in 'aeiou' else 'a'} {kind}")
+        for c in checks:
+            c(value)
+        if item is not None:
+            for v in value:
+                item(v)
+        if kind == "object":
+            for name in required:
+                if value.get(name) is None:
+                    raise ValidationError(f"Missing required field: {name}")
+            for name, field in fields.items():
+                if value.get(name) is not None:
+                    field(value[name])
+        return value
+    return check
+
+
+def compile_params(schemas: dict[str, dict], where: str) -> Callable[[dict[str, str]], dict]:
+    """
+    Validator for path or query parameters: {name: raw string} -> {name: typed value}.
+    Undeclared names are dropped; missing ones get `default` or are left out.
+    """
+    compiled = []
+    for name, schema in schemas.items():
+        label = f"{where} parameter '{name}'"
+        convert = _from_string(schema.get("type"), label)
+        checks = _constraints(schema, label)
+        compiled.append((name, convert, checks, schema.get("required", where == "path"), schema.get("default")))
+
+    def validate(raw: dict[str, str]) -> dict:
+        out = {}
+        for name, convert, checks, required, default in compiled:
+            value = raw.get(name)
+            if value is None or value == "":
+                if required:
+                    raise ValidationError(f"Missing required {where} parameter: {name}")
+                if default is not None:
+                    out[name] = default
+                continue
+            value = convert(value)
+            for c in checks:
+                c(value)
+            out[name] = value
+        return out
+    return validate
+
+
+def openapi_parameters(path_schemas: dict[str, dict], query_schemas: dict[str, dict]) -> list[dict]:
+    params = [{"name": name, "in": "path", "required": True, "schema": schema}
+              for name, schema in path_schemas.items()]
+    params += [{"name": name, "in": "query", "required": bool(schema.get("required")),
+                "schema": {k: v for k, v in schema.items() if k != "required"}}
+               for name, schema in query_schemas.items()]
+    return params
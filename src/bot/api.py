@@ -0,0 +1,139 @@
+"""
+Async client for the booking Worker API, shared by all bot handlers.
+
+One keep-alive connection pool per process, a cap on in-flight requests per
+host, retries with jittered exponential backoff on timeouts / 5xx, and a circuit
+breaker that fails fast while the API keeps failing.
+"""
+import asyncio, logging, random, time, uuid
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRY_METHODS = {"GET", "PUT", "DELETE"}
+
+
+class CircuitOpenError(Exception):
+    """The API failed too often recently; the call was not attempted."""
+
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        # half-open: let a probe through once the cool-down has passed
+        return time.monotonic() - self.opened_at >= self.reset_after
+
+    def success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning("API circuit opened after %d failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+def _on_behalf_of(headers: dict, telegram_id: int | None) -> dict:
+    # With the bot's X-Bot-Key the API rate-limits per Telegram user instead of per bot IP
+    if telegram_id is not None:
+        headers["X-Telegram-Id"] = str(telegram_id)
+    return headers
+
+
+def _retry_after(response: httpx.Response, cap: float) -> float:
+    try:
+        return min(cap, float(response.headers["Retry-After"]))
+    except ValueError:
+        return cap
+
+
+class ApiClient:
+    def __init__(self, base_url: str, *, api_key: str | None = None, timeout: float = 10.0,
+                 max_connections: int = 100, per_host: int = 20, retries: int = 3, backoff_base: float = 0.2,
+                 backoff_max: float = 3.0, breaker: CircuitBreaker | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self._per_host = per_host
+        self._host_slots: dict[str, asyncio.Semaphore] = {}
+        self._client = httpx.AsyncClient(
+            timeout=timeout,
+            headers={"X-Bot-Key": api_key} if api_key else None,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections),
+        )
+
+    def _slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_slots:
+            self._host_slots[host] = asyncio.Semaphore(self._per_host)
+        return self._host_slots[host]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        url = f"{self.base_url}{path}"
+        method = method.upper()
+        # with an Idempotency-Key the API replays the first response, so a POST is safe to resend
+        retryable = method in RETRY_METHODS or "Idempotency-Key" in (kwargs.get("headers") or {})
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{method} {path}: API circuit is open")
+            try:
+                async with self._slot(url):
+                    response = await self._client.request(method, url, **kwargs)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                self.breaker.failure()
+                # a POST without a key that may have reached the server is not replayed
+                replayable = retryable or isinstance(e, httpx.ConnectError)
+                if not replayable or attempt >= self.retries:
+                    raise
+                logger.info("%s %s failed (%s), retry %d", method, path, e.__class__.__name__, attempt + 1)
+            else:
+                if response.status_code < 500:
+                    self.breaker.success()
+                    # 409 + Retry-After: the first attempt with this Idempotency-Key is still running
+                    pending = response.status_code == 409 and "Retry-After" in response.headers
+                    if not (pending and retryable) or attempt >= self.retries:
+                        return response
+                    logger.info("%s %s still in progress, retry %d", method, path, attempt + 1)
+                    await asyncio.sleep(_retry_after(response, self.backoff_max))
+                    attempt += 1
+                    continue
+                self.breaker.failure()
+                if not retryable or attempt >= self.retries:
+                    return response
+                logger.info("%s %s -> %d, retry %d", method, path, response.status_code, attempt + 1)
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+
+    async def get(self, path: str, params: dict | None = None,
+                  telegram_id: int | None = None) -> httpx.Response:
+        return await self.request("GET", path, params=params, headers=_on_behalf_of({}, telegram_id) or None)
+
+    async def post(self, path: str, json: dict, idempotent: bool = True,
+                   telegram_id: int | None = None) -> httpx.Response:
+        """POSTs carry a fresh Idempotency-Key, reused by every retry of this call."""
+        headers = {"Idempotency-Key": uuid.uuid4().hex} if idempotent else {}
+        return await self.request("POST", path, json=json, headers=_on_behalf_of(headers, telegram_id) or None)
+
+    async def delete(self, path: str, telegram_id: int | None = None) -> httpx.Response:
+        return await self.request("DELETE", path, headers=_on_behalf_of({}, telegram_id) or None)
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
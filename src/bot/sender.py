@@ -0,0 +1,107 @@
+"""
+Outbound message queue with token-bucket limits per chat and for the whole bot.
+
+Telegram allows roughly 30 messages/s per bot and about one per second per chat.
+Calls are queued and released when both buckets have a token, so a burst is
+spread out instead of failing with RetryAfter; a chat that is over its budget
+is re-queued without holding up other chats.
+"""
+import asyncio, logging, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """0 if a token is available now, else seconds until there is one."""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+class SendQueue:
+    def __init__(self, global_rate: float = 25.0, global_burst: float = 30.0,
+                 chat_rate: float = 1.0, chat_burst: float = 3.0, max_chats: int = 10_000):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self._chats: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        self._chats.move_to_end(chat_id)
+        return bucket
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._queue
+
+    async def send(self, chat_id: int, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Queue `call` (e.g. lambda: bot.send_message(...)) and wait for its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._ensure_worker().put_nowait((chat_id, call, future))
+        return await future
+
+    def _requeue_later(self, delay: float, item) -> None:
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, item)
+
+    async def _run(self) -> None:
+        while True:
+            item = await self._queue.get()
+            chat_id, call, future = item
+            if future.cancelled():
+                continue
+            chat_wait = self._chat_bucket(chat_id).wait_time()
+            if chat_wait:
+                self._requeue_later(chat_wait, item)
+                continue
+            global_wait = self.global_bucket.wait_time()
+            if global_wait:
+                await asyncio.sleep(global_wait)
+            self.global_bucket.take()
+            self._chat_bucket(chat_id).take()
+            asyncio.get_running_loop().create_task(self._deliver(item))
+
+    async def _deliver(self, item) -> None:
+        chat_id, call, future = item
+        try:
+            result = await call()
+        except RetryAfter as e:
+            delay = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            logger.warning("flood limit for chat %s, retry in %ss", chat_id, delay)
+            self._requeue_later(float(delay), item)
+            return
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
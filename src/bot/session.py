@@ -0,0 +1,73 @@
+"""
+In-process cache of what the bot recently learned from the API.
+
+- telegram_id -> users.id, so a returning user books with a single POST
+- free slot times per date
+- booking lists per telegram_id, reused while paging
+
+Entries expire after a TTL and the least recently used go first when full.
+The bot drops the affected entries itself when it creates or deletes a booking.
+"""
+import logging, time
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    def __init__(self, name: str, ttl: float, max_entries: int = 10_000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key) -> tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def set(self, key, value) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        self._data.pop(key, None)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class SessionCache:
+    def __init__(self, user_ttl: float = 3600, slots_ttl: float = 30, bookings_ttl: float = 60,
+                 max_entries: int = 10_000, log_every: int = 500):
+        self.user_ids = TTLCache("user_ids", user_ttl, max_entries)
+        self.slots = TTLCache("slots", slots_ttl, max_entries)
+        self.bookings = TTLCache("bookings", bookings_ttl, max_entries)
+        self.log_every = log_every
+        self._lookups = 0
+
+    def lookup(self, cache: TTLCache, key) -> tuple[bool, Any]:
+        found = cache.get(key)
+        self._lookups += 1
+        if self._lookups % self.log_every == 0:
+            logger.info("session cache hit rates: %s", ", ".join(
+                f"{c.name}={c.hit_rate():.0%} ({c.hits}/{c.hits + c.misses})"
+                for c in (self.user_ids, self.slots, self.bookings)))
+        return found
+
+    def booking_changed(self, telegram_id: int, date: str | None = None) -> None:
+        self.bookings.pop(telegram_id)
+        if date:
+            self.slots.pop(date)
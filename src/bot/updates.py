@@ -0,0 +1,53 @@
+"""
+Concurrent update processing that keeps each chat in order.
+
+`concurrent_updates(True)` lets PTB run any two updates at once, including two
+from the same chat; the ConversationHandler then reads the second one against
+the state from before the first (name and phone sent quickly). ChatUpdateProcessor
+runs updates of different chats concurrently and those of one chat one by one,
+in arrival order.
+"""
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = 256):
+        super().__init__(max_concurrent_updates)
+        # chat id -> [lock, updates holding or waiting for it]; dropped when idle
+        self._chats: dict[Any, list] = {}
+
+    @staticmethod
+    def _key(update: object) -> Any:
+        if isinstance(update, Update):
+            if update.effective_chat is not None:
+                return update.effective_chat.id
+            if update.effective_user is not None:
+                return ("user", update.effective_user.id)
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = self._key(update)
+        if key is None:
+            await coroutine
+            return
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chats[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,226 @@
+"""
+Webhook ingress for the bot: an aiohttp endpoint that checks Telegram's secret
+token header and puts updates on bounded queues, one per worker. A chat always
+goes to the same worker (chat id modulo workers), so its updates are processed
+one at a time and in order while other chats run concurrently.
+
+Conversation state (ConversationHandler, user_data, the session cache) lives in
+the process that handles a chat. To use more than one core, serve_sharded()
+forks N processes, each with its own Application, and the ingress sends every
+update of a chat to the same one.
+"""
+import asyncio, hmac, json, logging, multiprocessing
+from typing import Any, Awaitable, Callable
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookIngress:
+    def __init__(self, process: Callable[[dict], Awaitable[None]], *, secret: str,
+                 path: str = "/telegram", workers: int = 16, queue_size: int = 1000):
+        self.process = process
+        self.secret = secret
+        self.path = path
+        self.workers = workers
+        self.queues: list[asyncio.Queue[dict]] = [asyncio.Queue(maxsize=max(1, queue_size // workers))
+                                                  for _ in range(workers)]
+        self.stats = {"accepted": 0, "rejected": 0, "processed": 0, "failed": 0}
+        self._tasks: list[asyncio.Task] = []
+        self._runner: web.AppRunner | None = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self.secret):
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        try:
+            self.queue_for(data).put_nowait(data)
+        except asyncio.QueueFull:
+            # Telegram redelivers on non-2xx, so back-pressure instead of dropping
+            self.stats["rejected"] += 1
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        self.stats["accepted"] += 1
+        return web.Response(status=200)
+
+    def queue_for(self, data: dict) -> "asyncio.Queue[dict]":
+        return self.queues[chat_key(data) % self.workers]
+
+    async def _work(self, queue: "asyncio.Queue[dict]") -> None:
+        while True:
+            data = await queue.get()
+            try:
+                await self.process(data)
+                self.stats["processed"] += 1
+            except Exception:
+                self.stats["failed"] += 1
+                logger.exception("update %s failed", data.get("update_id"))
+            finally:
+                queue.task_done()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    def start_workers(self) -> None:
+        self._tasks = [asyncio.create_task(self._work(queue)) for queue in self.queues]
+
+    async def start(self, host: str = "0.0.0.0", port: int = 8080) -> None:
+        self.start_workers()
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port, reuse_port=True).start()
+        logger.info("webhook ingress on %s:%d%s, %d workers", host, port, self.path, self.workers)
+
+    async def stop(self, drain: bool = True) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+        if drain:
+            await asyncio.gather(*(queue.join() for queue in self.queues))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def update_processor(application) -> Callable[[dict], Awaitable[None]]:
+    """Update JSON -> application.process_update; what the ingress workers run."""
+    from telegram import Update
+
+    async def process(data: dict) -> None:
+        await application.process_update(Update.de_json(data, application.bot))
+    return process
+
+
+async def serve(application, *, secret: str, host: str, port: int, path: str,
+                workers: int, queue_size: int, url: str | None = None,
+                on_shutdown: Callable[[object], Awaitable[None]] | None = None) -> None:
+    """Run a python-telegram-bot Application behind the ingress until cancelled."""
+    from telegram import Update
+
+    await application.initialize()
+    if url:
+        await application.bot.set_webhook(url, secret_token=secret, allowed_updates=Update.ALL_TYPES)
+    await application.start()
+    ingress = WebhookIngress(update_processor(application), secret=secret, path=path,
+                             workers=workers, queue_size=queue_size)
+    await ingress.start(host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await ingress.stop()
+        await application.stop()
+        if on_shutdown is not None:
+            await on_shutdown(application)
+        await application.shutdown()
+
+
+# -------------------------------
+# Several processes, one per chat
+# -------------------------------
+
+def chat_key(data: dict) -> int:
+    """The chat an update belongs to (else its sender): all of a conversation goes to one shard."""
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat and "id" in chat:
+            return int(chat["id"])
+        user = value.get("from") or value.get("user")
+        if user and "id" in user:
+            return int(user["id"])
+    return int(data.get("update_id", 0))
+
+
+async def _run_shard_async(application, queue, workers: int, queue_size: int) -> None:
+    await application.initialize()
+    await application.start()
+    local = WebhookIngress(update_processor(application), secret="", workers=workers, queue_size=queue_size)
+    local.start_workers()
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            raw = await loop.run_in_executor(None, queue.get)
+            if raw is None:
+                break
+            data = json.loads(raw)
+            await local.queue_for(data).put(data)
+    finally:
+        await local.stop()
+        logger.info("shard done: %s", local.stats)
+        await application.stop()
+        await application.shutdown()
+
+
+def _run_shard(make_application: Callable[[], Any], queue, workers: int, queue_size: int) -> None:
+    asyncio.run(_run_shard_async(make_application(), queue, workers, queue_size))
+
+
+class ChatShards:
+    """
+    Child processes that each run their own Application. Every update of a chat
+    goes to the same child, so conversation state needs no shared storage.
+    Create and start() before any event loop runs in this process (fork).
+    """
+
+    def __init__(self, make_application: Callable[[], Any], processes: int, *,
+                 workers: int = 16, queue_size: int = 1000):
+        ctx = multiprocessing.get_context("fork")
+        self.workers = workers
+        self.queues = [ctx.Queue(maxsize=queue_size) for _ in range(processes)]
+        self.processes = [ctx.Process(target=_run_shard, args=(make_application, q, workers, queue_size),
+                                      name=f"bot-shard-{i}", daemon=True)
+                          for i, q in enumerate(self.queues)]
+
+    def start(self) -> None:
+        for proc in self.processes:
+            proc.start()
+
+    async def process(self, data: dict) -> None:
+        # Inside a shard the worker is chat id modulo workers; dividing first keeps
+        # every shard's chats spread over all of its workers
+        queue = self.queues[chat_key(data) // self.workers % len(self.queues)]
+        # put() blocks while the shard is behind; that backs up the ingress queue (-> 503)
+        await asyncio.get_running_loop().run_in_executor(None, queue.put, json.dumps(data))
+
+    def stop(self, timeout: float = 30.0) -> None:
+        """Let every shard finish its queue, then wait for it to exit."""
+        for queue in self.queues:
+            queue.put(None)
+        for proc in self.processes:
+            proc.join(timeout)
+
+
+async def _ingress_only(shards: ChatShards, make_application, *, secret: str, host: str, port: int,
+                        path: str, workers: int, queue_size: int, url: str | None) -> None:
+    if url:
+        from telegram import Update
+        async with make_application().bot as bot:
+            await bot.set_webhook(url, secret_token=secret, allowed_updates=Update.ALL_TYPES)
+    ingress = WebhookIngress(shards.process, secret=secret, path=path, workers=workers, queue_size=queue_size)
+    await ingress.start(host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await ingress.stop()
+
+
+def serve_sharded(make_application: Callable[[], Any], processes: int, *, secret: str, host: str, port: int,
+                  path: str, workers: int, queue_size: int, url: str | None = None) -> None:
+    """Blocking: fork `processes` shards, then run the ingress in this process until interrupted."""
+    shards = ChatShards(make_application, processes, workers=workers, queue_size=queue_size)
+    shards.start()
+    try:
+        asyncio.run(_ingress_only(shards, make_application, secret=secret, host=host, port=port, path=path,
+                                  workers=workers, queue_size=queue_size, url=url))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shards.stop()
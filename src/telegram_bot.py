@@ -1,4 +1,4 @@
-import os, re, logging, urllib.parse, requests
+import asyncio, os, re, logging, urllib.parse
 from typing import List
 from telegram import (
     Update, InlineKeyboardButton, InlineKeyboardMarkup,
@@ -10,29 +10,27 @@ from telegram.ext import (
 )
 from telegram.ext import MessageHandler, filters
 
+from bot.api import ApiClient
+from bot.sender import SendQueue
+from bot.session import SessionCache
+from bot.updates import ChatUpdateProcessor
+
 
 API_URL = "https://booking-worker-py-be.squary50.workers.dev/api"
 BOT_TOKEN = os.getenv("BOT_TOKEN", "7364112514:AAGi4LAVefHuljYgSIPbxvQK-Kvs_yvW4Tk")
+# polling (default) or webhook; webhook mode needs WEBHOOK_SECRET
+BOT_MODE = os.getenv("BOT_MODE", "polling")
 CHOOSING_DATE, CHOOSING_TIME, ENTER_NAME, ENTER_PHONE = range(4)
 DEFAULT_SLOTS: List[str] = ["10:00", "11:00", "12:00", "14:00", "15:00", "16:00"]
+BOOKINGS_PAGE_SIZE = 8
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def api_get(path: str, params: dict | None = None):
-    url = f"{API_URL}{path}"
-    return requests.get(url, params=params, timeout=10)
-
-
-def api_post(path: str, json: dict):
-    url = f"{API_URL}{path}"
-    return requests.post(url, json=json, timeout=10)
-
-
-def api_delete(path: str):
-    url = f"{API_URL}{path}"
-    return requests.delete(url, timeout=10)
+api = ApiClient(API_URL, api_key=os.getenv("BOT_API_KEY"))
+sender = SendQueue()
+session = SessionCache()
 
 
 def is_valid_date(date_str: str) -> bool:
@@ -66,8 +64,11 @@ async def choose_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     context.user_data["date"] = date
     try:
-        r = api_get("/bookings/by-user/999998")
-        slots = [s["time"] for s in r.json() if s.get("date") == date]
+        found, slots = session.lookup(session.slots, date)
+        if not found:
+            r = await api.get("/slots", {"date": date}, telegram_id=update.effective_user.id)
+            slots = [s["time"] for s in r.json()["slots"]]
+            session.slots.set(date, slots)
         context.user_data["available_slots"] = slots
     except:
         await update.message.reply_text("❌ Ошибка загрузки слотов.")
@@ -83,7 +84,7 @@ async def choose_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def choose_time_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    time = update.callback_query.data.split(":")[1]
+    time = update.callback_query.data.split(":", 1)[1]
     await update.callback_query.answer()
     context.user_data["time"] = time
     await update.callback_query.message.reply_text("Введите ваше имя:")
@@ -103,18 +104,22 @@ async def enter_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = update.effective_user.id
 
     try:
-        r = api_get("/users", {"telegram_id": telegram_id})
-        users = r.json()
-        if users:
-            user_id = users[0]["id"]
-        else:
-            r = api_post("/users", {
-                "telegram_id": telegram_id,
-                "name": context.user_data["name"],
-                "phone": phone,
-                "role": "user"
-            })
-            user_id = r.json().get("id")
+        found, user_id = session.lookup(session.user_ids, telegram_id)
+        if not found:
+            r = await api.get("/users", {"telegram_id": telegram_id}, telegram_id=telegram_id)
+            users = r.json()
+            if users:
+                user_id = users[0]["id"]
+            else:
+                r = await api.post("/users", {
+                    "telegram_id": telegram_id,
+                    "name": context.user_data["name"],
+                    "phone": phone,
+                    "role": "user"
+                }, telegram_id=telegram_id)
+                user_id = r.json().get("id")
+            if user_id is not None:
+                session.user_ids.set(telegram_id, user_id)
     except:
         await update.message.reply_text("❌ Ошибка регистрации.")
         return ConversationHandler.END
@@ -126,8 +131,9 @@ async def enter_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
 
     try:
-        r = api_post("/bookings", booking)
-        if r.status_code == 201:
+        r = await api.post("/bookings", booking, telegram_id=telegram_id)
+        session.booking_changed(telegram_id, booking["date"])
+        if r.status_code in (200, 201):
             await update.message.reply_text("✅ Запись создана!")
             buttons = [
                 [InlineKeyboardButton("📋 Мои записи", callback_data="show_bookings")],
@@ -141,20 +147,44 @@ async def enter_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+def bookings_page(bookings: list, page: int, note: str = ""):
+    """One message: a delete button per booking on this page plus prev/next."""
+    pages = max(1, -(-len(bookings) // BOOKINGS_PAGE_SIZE))
+    page = min(max(page, 0), pages - 1)
+    chunk = bookings[page * BOOKINGS_PAGE_SIZE:(page + 1) * BOOKINGS_PAGE_SIZE]
+    rows = [[InlineKeyboardButton(f"❌ {b['date']} в {b['time']}", callback_data=f"delete:{b['id']}:{page}")]
+            for b in chunk]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("◀️", callback_data=f"bookings:{page - 1}"))
+    if page < pages - 1:
+        nav.append(InlineKeyboardButton("▶️", callback_data=f"bookings:{page + 1}"))
+    if nav:
+        rows.append(nav)
+    text = f"{note}\n" if note else ""
+    text += f"📅 Ваши записи ({len(bookings)}), стр. {page + 1}/{pages}. Нажмите, чтобы удалить:"
+    return text, InlineKeyboardMarkup(rows)
+
+
+async def fetch_bookings(telegram_id: int) -> list:
+    found, bookings = session.lookup(session.bookings, telegram_id)
+    if not found:
+        r = await api.get(f"/bookings/by-user/{telegram_id}", telegram_id=telegram_id)
+        bookings = r.json()
+        session.bookings.set(telegram_id, bookings)
+    return bookings
+
+
 async def send_bookings(chat_id: int, telegram_id: int, context: ContextTypes.DEFAULT_TYPE):
     try:
-        r = api_get(f"/bookings/by-user/{telegram_id}")
-        bookings = r.json()
+        bookings = await fetch_bookings(telegram_id)
         if not bookings:
-            await context.bot.send_message(chat_id, "У вас нет записей.")
+            await sender.send(chat_id, lambda: context.bot.send_message(chat_id, "У вас нет записей."))
             return
-
-        for b in bookings:
-            text = f"📅 {b['date']} в {b['time']}"
-            btn = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Удалить", callback_data=f"delete:{b['id']}")]])
-            await context.bot.send_message(chat_id, text, reply_markup=btn)
+        text, markup = bookings_page(bookings, 0)
+        await sender.send(chat_id, lambda: context.bot.send_message(chat_id, text, reply_markup=markup))
     except:
-        await context.bot.send_message(chat_id, "❌ Ошибка загрузки записей.")
+        await sender.send(chat_id, lambda: context.bot.send_message(chat_id, "❌ Ошибка загрузки записей."))
 
 
 async def show_bookings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -162,15 +192,38 @@ async def show_bookings_callback(update: Update, context: ContextTypes.DEFAULT_T
     await send_bookings(update.effective_chat.id, update.effective_user.id, context)
 
 
+async def edit_bookings_message(update: Update, page: int, note: str = ""):
+    query = update.callback_query
+    chat_id = update.effective_chat.id
+    bookings = await fetch_bookings(update.effective_user.id)
+    if not bookings:
+        await sender.send(chat_id, lambda: query.edit_message_text(f"{note}\nУ вас нет записей.".strip()))
+        return
+    text, markup = bookings_page(bookings, page, note)
+    await sender.send(chat_id, lambda: query.edit_message_text(text, reply_markup=markup))
+
+
+async def bookings_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await update.callback_query.answer()
+    page = int(update.callback_query.data.split(":")[1])
+    try:
+        await edit_bookings_message(update, page)
+    except:
+        await update.callback_query.edit_message_text("❌ Ошибка загрузки записей.")
+
+
 async def delete_booking(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.callback_query.answer()
-    booking_id = update.callback_query.data.split(":")[1]
+    parts = update.callback_query.data.split(":")
+    booking_id = parts[1]
+    page = int(parts[2]) if len(parts) > 2 else 0
     try:
-        r = api_delete(f"/bookings/{booking_id}")
-        if r.status_code == 200:
-            await update.callback_query.edit_message_text("✅ Запись удалена.")
-        else:
-            await update.callback_query.edit_message_text("❌ Ошибка удаления.")
+        r = await api.delete(f"/bookings/{booking_id}", telegram_id=update.effective_user.id)
+        _found, cached = session.bookings.get(update.effective_user.id)
+        date = next((b["date"] for b in cached or [] if str(b["id"]) == booking_id), None)
+        session.booking_changed(update.effective_user.id, date)
+        note = "✅ Запись удалена." if r.status_code == 200 else "❌ Ошибка удаления."
+        await edit_bookings_message(update, page, note)
     except:
         await update.callback_query.edit_message_text("❌ Ошибка удаления.")
 
@@ -186,28 +239,62 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
-def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+async def close_api(_app):
+    await api.aclose()
+
+
+def build_app(builder: ApplicationBuilder | None = None):
+    app = ((builder or ApplicationBuilder()).token(BOT_TOKEN)
+           .concurrent_updates(ChatUpdateProcessor())
+           .post_shutdown(close_api)
+           .build())
 
+    # Ключ разговора — чат и пользователь (per_message=True отбрасывал текстовые ответы)
     conv = ConversationHandler(
         entry_points=[CommandHandler("book", book)],
         states={
-            CHOOSING_DATE: [CommandHandler("cancel", cancel), CallbackQueryHandler(choose_time_callback, pattern="^time:")],
+            CHOOSING_DATE: [CommandHandler("cancel", cancel), MessageHandler(filters.TEXT & ~filters.COMMAND, choose_date)],
             CHOOSING_TIME: [CallbackQueryHandler(choose_time_callback, pattern="^time:")],
             ENTER_NAME: [CommandHandler("cancel", cancel), CallbackQueryHandler(book_again_callback, pattern="^book_again$"), MessageHandler(filters.TEXT & ~filters.COMMAND, enter_name)],
             ENTER_PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, enter_phone)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
-        per_message=True
     )
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(conv)
     app.add_handler(CallbackQueryHandler(show_bookings_callback, pattern="^show_bookings$"))
     app.add_handler(CallbackQueryHandler(delete_booking, pattern="^delete:"))
+    app.add_handler(CallbackQueryHandler(bookings_page_callback, pattern="^bookings:"))
     app.add_handler(CallbackQueryHandler(book_again_callback, pattern="^book_again$"))
+    return app
 
-    app.run_polling()
+
+def main():
+    if BOT_MODE == "webhook":
+        run_webhook()
+    else:
+        build_app().run_polling()
+
+
+def run_webhook():
+    from bot.webhook import serve, serve_sharded
+
+    options = dict(
+        secret=os.environ["WEBHOOK_SECRET"],
+        host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+        port=int(os.getenv("WEBHOOK_PORT", "8080")),
+        path=os.getenv("WEBHOOK_PATH", "/telegram"),
+        workers=int(os.getenv("WEBHOOK_WORKERS", "16")),
+        queue_size=int(os.getenv("WEBHOOK_QUEUE", "1000")),
+        url=os.getenv("WEBHOOK_URL") if os.getenv("WEBHOOK_REGISTER") == "1" else None,
+    )
+    processes = int(os.getenv("WEBHOOK_PROCESSES", "1"))
+    if processes > 1:
+        # Чат всегда обрабатывает один и тот же процесс — состояние разговора не теряется
+        serve_sharded(build_app, processes, **options)
+    else:
+        asyncio.run(serve(build_app(), on_shutdown=close_api, **options))
 
 
 if __name__ == "__main__":
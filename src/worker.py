@@ -1,17 +1,19 @@
 from workers import WorkerEntrypoint, Request, Response  # type: ignore
-from app.router import match, split_url, respond_json
-from app.swagger import swagger_page, openapi_json
-import traceback
+from app.router import match, allowed_methods, split_url, declare
+from app import metrics, admission
+from app.endpoints import ROUTES
+import time
 import json
 
-# Импорт эндпоинтов (через @route)
-from app.endpoints import meta, users  # noqa: F401
+# Эндпоинты объявлены манифестом; модуль импортируется при первом совпадении (холодный старт).
+# Swagger, traceback и idempotency тоже импортируются только по месту.
+declare(ROUTES)
 
 # 🔧 Общие CORS заголовки
 CORS_HEADERS = {
     "Access-Control-Allow-Origin": "*",
     "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-    "Access-Control-Allow-Headers": "Content-Type, Authorization"
+    "Access-Control-Allow-Headers": "Content-Type, Authorization, Idempotency-Key, X-Telegram-Id"
 }
 
 def respond_error(status: int, msg: str = "Internal Server Error") -> Response:
@@ -42,35 +44,56 @@ class Default(WorkerEntrypoint):
             if not isinstance(getattr(request, "scope", None), dict):
                 request.scope = {}
             request.scope["env"] = self.env
-
-            # Проверка базы (для отладки)
-            try:
-                db = self.env.DB
-                stmt = db.prepare("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-                result = await stmt.first()
-                print("🔍 Table 'users' exists:", bool(result))
-            except Exception as e:
-                print("❌ DB access failed:", e)
-
+            # Схема проверяется лениво и кэшируется на изолят: см. app/schema.py, /ready
+            timer = metrics.begin(request)
         except Exception:
             return respond_error(500)
 
+        response = await self.dispatch(request, timer)
+        metrics.finish(timer, response)
+        return response
+
+    async def scheduled(self, controller, env, ctx):
+        # Cron (wrangler.toml [triggers]): чистим просроченные Idempotency-Key
+        from app.idempotency import purge_expired
+        removed = await purge_expired(self.env)
+        metrics.log_event("idempotency_purge", removed=removed)
+
+    async def dispatch(self, request: Request, timer: "metrics.RequestTimer") -> Response:
         try:
             path, _query = split_url(request)
             method = request.method
 
             # ⚙️ Обработка preflight
             if method == "OPTIONS":
+                timer.route = "preflight"
                 return respond_cors_preflight()
 
             if path == "/" or path == "/docs":
+                from app.swagger import swagger_page
+                timer.route = "/docs"
                 return wrap_with_cors(swagger_page())
             if path == "/openapi.json":
-                return wrap_with_cors(openapi_json())
+                from app.swagger import openapi_json
+                timer.route = path
+                return wrap_with_cors(openapi_json(request))
 
-            handler, params, _ = match(method, path)
+            started = time.perf_counter()
+            handler, params, meta = match(method, path)
+            timer.match_ms = (time.perf_counter() - started) * 1000
             if not handler:
+                allow = allowed_methods(path)
+                if allow:
+                    return wrap_with_cors(Response("Method not allowed", status=405, headers={
+                        "Allow": ", ".join(allow + ["OPTIONS"] if "OPTIONS" not in allow else allow)
+                    }))
                 return wrap_with_cors(Response("Not found", status=404))
+            timer.route = meta["path"]
+
+            # Лимиты на клиента и сброс чтений при медленном D1 — до обращения к базе
+            rejected = admission.admit(request, method, meta, params)
+            if rejected is not None:
+                return wrap_with_cors(rejected)
 
             result = await handler(request, **(params or {}))
             if isinstance(result, Response):
@@ -78,6 +101,7 @@ class Default(WorkerEntrypoint):
             return respond_json(result)
 
         except Exception as e:
-            print("UNHANDLED ERROR:", e)
-            print(traceback.format_exc())
+            import traceback
+            metrics.log_event("unhandled_error", method=request.method, route=timer.route,
+                              error=repr(e), traceback=traceback.format_exc())
             return respond_error(500)